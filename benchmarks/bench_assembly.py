@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+精灵图拼接对比：PIL逐帧paste vs NumPy预分配数组切片赋值
+
+用法:
+    python benchmarks/bench_assembly.py [--counts 16,64,256] [--sizes 128,256,512] [--repeat 3]
+使用随机生成的RGBA帧（四周留透明边），按网格布局拼接
+"""
+
+import argparse
+import math
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+from PIL import Image
+
+from src.sprite_packer import assemble_sheet
+
+
+def make_frames(count, size):
+    """生成带透明边缘的随机RGBA帧"""
+    rng = np.random.default_rng(0)
+    frames = []
+    for _ in range(count):
+        frame = np.zeros((size, size, 4), dtype=np.uint8)
+        margin = size // 8
+        frame[margin:-margin, margin:-margin] = rng.integers(
+            0, 256, (size - 2 * margin, size - 2 * margin, 4), dtype=np.uint8)
+        frames.append(frame)
+    return frames
+
+
+def grid_positions(count, size, max_width=2048, padding=2):
+    """与FrameProcessor._create_sprite_sheet相同的网格布局"""
+    per_row = max(1, min(count, max_width // (size + padding)))
+    rows = math.ceil(count / per_row)
+    width = per_row * (size + padding) - padding
+    height = rows * (size + padding) - padding
+    positions = [((i % per_row) * (size + padding), (i // per_row) * (size + padding))
+                 for i in range(count)]
+    return positions, width, height
+
+
+def assemble_pil(frames, positions, width, height):
+    """原实现：每帧转成PIL图像后paste，统计信息需要重新读取"""
+    sheet = Image.new('RGBA', (width, height), (0, 0, 0, 0))
+    for frame, position in zip(frames, positions):
+        sheet.paste(Image.fromarray(frame), position)
+    alpha = np.asarray(sheet.getchannel('A'))
+    return sheet, int(np.count_nonzero(alpha))
+
+
+def assemble_numpy(frames, positions, width, height):
+    placements = [(frame, x, y) for frame, (x, y) in zip(frames, positions)]
+    return assemble_sheet(width, height, placements)
+
+
+def best_time(func, repeat):
+    best = float('inf')
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="精灵图拼接对比")
+    parser.add_argument('--counts', default='16,64,256')
+    parser.add_argument('--sizes', default='128,256,512')
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"  {'帧数':>6}{'单帧':>8}{'精灵图':>14}{'PIL':>10}{'NumPy':>10}{'加速比':>8}")
+    for size in [int(s) for s in args.sizes.split(',')]:
+        for count in [int(c) for c in args.counts.split(',')]:
+            frames = make_frames(count, size)
+            positions, width, height = grid_positions(count, size)
+
+            pil_time, (pil_sheet, pil_opaque) = best_time(
+                lambda: assemble_pil(frames, positions, width, height), args.repeat)
+            np_time, (np_sheet, np_opaque) = best_time(
+                lambda: assemble_numpy(frames, positions, width, height), args.repeat)
+
+            # 两种方式的像素和统计结果必须一致
+            assert np.array_equal(np.asarray(pil_sheet), np_sheet)
+            assert pil_opaque == np_opaque
+
+            print(f"  {count:>6}{size:>7}px{f'{width}x{height}':>14}"
+                  f"{pil_time * 1000:>8.1f}ms{np_time * 1000:>8.1f}ms{pil_time / np_time:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+下载器吞吐量对比：原requests.get逐8KB写入 vs 连接池/自适应块/分段并行下载器
+
+用法:
+    python benchmarks/bench_download.py [--size-mb 64] [--files 8] [--drop-after-mb 0]
+在本机启动支持Range的HTTP服务器，下载随机内容文件并校验sha256。
+--drop-after-mb 大于0时，服务器在每个连接发送该数据量后断开，用于验证续传。
+"""
+
+import argparse
+import hashlib
+import os
+import re
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import requests
+
+from src.downloader import Downloader
+
+_RANGE = re.compile(r'bytes=(\d+)-(\d*)')
+
+
+def make_handler(payload, drop_after):
+    class RangeHandler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def do_GET(self):
+            start, end = 0, len(payload) - 1
+            match = _RANGE.match(self.headers.get('Range', ''))
+            if match:
+                start = int(match.group(1))
+                end = min(int(match.group(2)), end) if match.group(2) else end
+                if start >= len(payload):
+                    self.send_response(416)
+                    self.send_header('Content-Range', f'bytes */{len(payload)}')
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+                self.send_response(206)
+                self.send_header('Content-Range', f'bytes {start}-{end}/{len(payload)}')
+            else:
+                self.send_response(200)
+            self.send_header('Content-Length', str(end - start + 1))
+            self.send_header('Accept-Ranges', 'bytes')
+            self.end_headers()
+
+            body = memoryview(payload)[start:end + 1]
+            if drop_after and len(body) > drop_after:
+                # 模拟连接中途断开
+                self.wfile.write(body[:drop_after])
+                self.close_connection = True
+                return
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    return RangeHandler
+
+
+def download_baseline(url, path):
+    """原utils.download_file的实现"""
+    response = requests.get(url, stream=True, timeout=300)
+    response.raise_for_status()
+    with open(path, 'wb') as f:
+        for chunk in response.iter_content(chunk_size=8192):
+            if chunk:
+                f.write(chunk)
+
+
+def sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="下载器吞吐量对比")
+    parser.add_argument('--size-mb', type=float, default=64)
+    parser.add_argument('--files', type=int, default=8)
+    parser.add_argument('--drop-after-mb', type=float, default=0)
+    args = parser.parse_args()
+
+    payload = os.urandom(int(args.size_mb * 1024 * 1024))
+    expected = 'sha256:' + hashlib.sha256(payload).hexdigest()
+    drop_after = int(args.drop_after_mb * 1024 * 1024)
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), make_handler(payload, drop_after))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}/video.mp4"
+
+    modes = {
+        'downloader(单连接)': Downloader({'parallel_threshold_mb': 0}),
+        'downloader(并行)': Downloader({'parallel_threshold_mb': 1}),
+    }
+
+    print(f"文件: {args.size_mb:g} MB x {args.files}" +
+          (f"  每个连接 {args.drop_after_mb:g} MB 后断开" if drop_after else ""))
+    print(f"  {'方式':<20}{'耗时':>10}{'吞吐':>14}{'校验':>8}")
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        if not drop_after:
+            start = time.perf_counter()
+            ok = True
+            for i in range(args.files):
+                path = os.path.join(tmp_dir, f"baseline_{i}.mp4")
+                download_baseline(url, path)
+                ok = ok and 'sha256:' + sha256(path) == expected
+            elapsed = time.perf_counter() - start
+            print(f"  {'requests.get 8KB':<20}{elapsed:>9.2f}s"
+                  f"{args.size_mb * args.files / elapsed:>10.1f} MB/s{'✓' if ok else '✗':>8}")
+
+        for name, downloader in modes.items():
+            start = time.perf_counter()
+            ok = True
+            for i in range(args.files):
+                path = os.path.join(tmp_dir, f"{i}.mp4")
+                downloader.download(url, path, checksum=expected)
+                ok = ok and not os.path.exists(path + '.part')
+            elapsed = time.perf_counter() - start
+            print(f"  {name:<20}{elapsed:>9.2f}s"
+                  f"{args.size_mb * args.files / elapsed:>10.1f} MB/s{'✓' if ok else '✗':>8}")
+
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+精灵图编码器对比：文件体积与编码耗时
+
+用法:
+    python benchmarks/bench_encoders.py <精灵图PNG路径> [--palette-colors 256] [--webp-quality 90]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+from PIL import Image
+
+from src.sprite_encoder import ENCODERS, save_sprite_sheet, build_palette
+
+
+def format_size(size_bytes):
+    for unit in ['B', 'KB', 'MB', 'GB']:
+        if size_bytes < 1024.0:
+            return f"{size_bytes:.1f} {unit}"
+        size_bytes /= 1024.0
+    return f"{size_bytes:.1f} TB"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="精灵图编码器对比")
+    parser.add_argument('sheet', help="RGBA精灵图路径")
+    parser.add_argument('--palette-colors', type=int, default=256)
+    parser.add_argument('--webp-quality', type=int, default=90)
+    args = parser.parse_args()
+
+    image = Image.open(args.sheet).convert('RGBA')
+    rgba = np.asarray(image)
+    options = {'palette_colors': args.palette_colors, 'webp_quality': args.webp_quality}
+    print(f"精灵图: {image.size[0]} x {image.size[1]} px  原始数据: {format_size(rgba.nbytes)}")
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for encoder in ENCODERS:
+            start = time.perf_counter()
+            palette = build_palette([rgba], args.palette_colors) if encoder == 'png_palette' else None
+            path, size = save_sprite_sheet(rgba, os.path.join(tmp_dir, encoder), encoder, options, palette)
+            elapsed = time.perf_counter() - start
+
+            # 解码校验，同时计算与原图的误差
+            decoded = np.asarray(Image.open(path).convert('RGBA')).astype(np.int16)
+            error = np.abs(decoded - rgba).mean()
+            results.append((encoder, size, elapsed, error))
+
+    baseline_size, baseline_time = results[0][1], results[0][2]
+    print(f"  {'编码器':<16}{'体积':>12}{'体积比':>8}{'耗时':>10}{'加速比':>8}{'平均误差':>10}")
+    for encoder, size, elapsed, error in results:
+        print(f"  {encoder:<16}{format_size(size):>12}{size / baseline_size:>8.2f}"
+              f"{elapsed:>9.2f}s{baseline_time / elapsed:>7.1f}x{error:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
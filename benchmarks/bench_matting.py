@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+抠图吞吐量对比：rembg逐帧调用 vs 批量推理引擎
+
+用法:
+    python benchmarks/bench_matting.py [视频路径] [--model isnet-anime] [--frames 24] [--batch-sizes 1,4,8,16]
+不指定视频时使用随机生成的帧
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import cv2
+import numpy as np
+from rembg import remove, new_session
+
+from src.matting import MattingEngine, DEFAULT_ALPHA_MATTING
+
+
+def load_frames(video_path, count, size):
+    """读取视频前count帧，没有视频时生成随机帧"""
+    if not video_path:
+        rng = np.random.default_rng(0)
+        width, height = size
+        return [rng.integers(0, 256, (height, width, 3), dtype=np.uint8) for _ in range(count)]
+
+    cap = cv2.VideoCapture(video_path)
+    frames = []
+    while len(frames) < count:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        frames.append(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+    cap.release()
+    return frames
+
+
+def run(label, func, frame_count):
+    start = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - start
+    print(f"  {label:<20} {elapsed:8.2f}s  {frame_count / elapsed:8.2f} 帧/秒")
+    return elapsed
+
+
+def max_alpha_diff(results, expected):
+    """与rembg.remove逐帧结果相比，alpha通道的最大差值（批量推理的数值误差应只有几个灰度级）"""
+    return max(int(np.abs(a[..., 3].astype(np.int16) - b[..., 3]).max()) for a, b in zip(results, expected))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="抠图吞吐量对比")
+    parser.add_argument('video', nargs='?', help="输入视频路径")
+    parser.add_argument('--model', default='isnet-anime')
+    parser.add_argument('--frames', type=int, default=24)
+    parser.add_argument('--batch-sizes', default='1,4,8,16')
+    parser.add_argument('--alpha-matting', action='store_true', help="同时计入alpha matting的耗时")
+    args = parser.parse_args()
+
+    frames = load_frames(args.video, args.frames, (720, 1280))
+    session = new_session(args.model)
+    params = dict(DEFAULT_ALPHA_MATTING, alpha_matting=args.alpha_matting)
+
+    print(f"模型: {args.model}  帧数: {len(frames)}  alpha matting: {args.alpha_matting}")
+
+    # 预热，避免首次推理的初始化开销影响结果
+    remove(frames[0], session=session)
+
+    expected = []
+    baseline = run("rembg逐帧", lambda: expected.extend(remove(f, session=session, **params) for f in frames),
+                   len(frames))
+
+    for batch_size in [int(b) for b in args.batch_sizes.split(',')]:
+        engine = MattingEngine(session, args.model, batch_size, params)
+        results = []
+        elapsed = run(f"批量 batch={batch_size}", lambda: results.extend(engine.process(frames)), len(frames))
+        print(f"  {'':<20} 加速比: {baseline / elapsed:.2f}x  与rembg的最大alpha差: {max_alpha_diff(results, expected)}")
+
+
+if __name__ == "__main__":
+    main()
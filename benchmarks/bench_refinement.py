@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+边缘细化对比：rembg全图alpha matting vs 不确定带导向滤波
+
+用法:
+    python benchmarks/bench_refinement.py <视频路径> [--model isnet-anime] [--frames 12]
+以rembg alpha matting的结果为参考，统计各模式在边缘带内的alpha误差和单帧耗时
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import cv2
+import numpy as np
+from rembg import new_session
+
+from src.matting import MattingEngine, REFINEMENT_PRESETS
+from bench_matting import load_frames
+
+
+def edge_band(mask, width=12):
+    """mask边缘附近的像素（误差只在这里有意义）"""
+    binary = (np.asarray(mask) >= 128).astype(np.uint8)
+    kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (2 * width + 1, 2 * width + 1))
+    return cv2.dilate(binary, kernel) > cv2.erode(binary, kernel)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="边缘细化对比")
+    parser.add_argument('video', help="输入视频路径")
+    parser.add_argument('--model', default='isnet-anime')
+    parser.add_argument('--frames', type=int, default=12)
+    args = parser.parse_args()
+
+    frames = load_frames(args.video, args.frames, None)
+    session = new_session(args.model)
+
+    # mask只推理一次，各模式只比较细化阶段
+    masks = MattingEngine(session, args.model).predict_masks(frames)
+    bands = [edge_band(mask) for mask in masks]
+
+    results = {}
+    for refinement in REFINEMENT_PRESETS:
+        engine = MattingEngine(session, args.model, refinement=refinement)
+        start = time.perf_counter()
+        outputs = [engine.cutout(frame, mask) for frame, mask in zip(frames, masks)]
+        elapsed = (time.perf_counter() - start) / len(frames)
+        results[refinement] = (outputs, elapsed)
+
+    reference, ref_time = results['alpha_matting']
+    print(f"模型: {args.model}  帧数: {len(frames)}  (参考: alpha_matting)")
+    print(f"  {'模式':<16}{'单帧耗时':>10}{'加速比':>8}{'边缘SAD':>12}{'边缘MSE':>10}")
+    for refinement, (outputs, elapsed) in results.items():
+        sad = []
+        mse = []
+        for out, ref, band in zip(outputs, reference, bands):
+            diff = out[..., 3].astype(np.float32)[band] - ref[..., 3].astype(np.float32)[band]
+            sad.append(np.abs(diff).sum() / 1000.0)
+            mse.append((diff ** 2).mean() if diff.size else 0.0)
+        print(f"  {refinement:<16}{elapsed * 1000:>8.1f}ms{ref_time / elapsed:>7.1f}x"
+              f"{np.mean(sad):>12.1f}{np.mean(mse):>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""
+模型切换耗时对比：每次切换重新加载（原set_model） vs 进程内会话池
+
+用法:
+    python benchmarks/bench_session_pool.py [--models isnet-anime,u2net] [--switches 6] [--budget-mb 1024]
+模拟长期运行的工作进程在多个抠图模型之间交替处理任务。
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from rembg import new_session
+
+from src.session_pool import SessionPool
+
+
+def main():
+    parser = argparse.ArgumentParser(description="模型切换耗时对比")
+    parser.add_argument('--models', default='isnet-anime,u2net')
+    parser.add_argument('--switches', type=int, default=6)
+    parser.add_argument('--budget-mb', type=float, default=1024)
+    args = parser.parse_args()
+
+    models = args.models.split(',')
+    sequence = [models[i % len(models)] for i in range(args.switches)]
+
+    # 先加载一次，模型文件下载和模块导入不计入对比
+    for model in models:
+        new_session(model)
+
+    start = time.perf_counter()
+    session = None
+    for model in sequence:
+        session = new_session(model)
+    reload_time = time.perf_counter() - start
+
+    pool = SessionPool({'memory_budget_mb': args.budget_mb})
+    start = time.perf_counter()
+    session = None
+    for model in sequence:
+        if session is not None:
+            pool.release(session)
+        session = pool.acquire(model)
+    pool_time = time.perf_counter() - start
+
+    stats = pool.stats()
+    print(f"切换 {args.switches} 次: {' → '.join(sequence)}")
+    print(f"  {'每次重新加载':<12}{reload_time:>8.2f}s")
+    print(f"  {'会话池':<12}{pool_time:>8.2f}s  (加载 {stats['loads']} 次，复用 {stats['hits']} 次，"
+          f"淘汰 {stats['evictions']} 次，占用约 {stats['memory_mb']:.0f} MB)")
+
+
+if __name__ == "__main__":
+    main()
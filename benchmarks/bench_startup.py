@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+启动耗时与首帧抠图耗时：启动时导入全部模块 vs 按需导入；视频到达后加载模型 vs 后台预加载
+
+用法:
+    python benchmarks/bench_startup.py [--model isnet-anime] [--video-wait 5] [--repeat 3]
+每项测量都在独立的子进程中进行，避免模块和模型已被加载影响结果。
+--video-wait 模拟等待视频生成的时间，预加载在这段时间内进行。
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# 原main.py启动时导入的模块
+EAGER_IMPORTS = "import src.prompt_enhancer, src.image_generator, src.video_generator, src.frame_processor, rembg"
+# 现在启动时导入的模块（到第一个提示为止）
+LAZY_IMPORTS = "import main"
+
+
+def time_subprocess(code):
+    """子进程从启动到执行完code的耗时（包括解释器启动）"""
+    env = dict(os.environ)
+    env.setdefault('OPENAI_API_KEY', 'bench')
+    env.setdefault('ARK_API_KEY', 'bench')
+    start = time.perf_counter()
+    subprocess.run([sys.executable, '-c', code], cwd=ROOT, env=env, check=True,
+                   stdout=subprocess.DEVNULL)
+    return time.perf_counter() - start
+
+
+def first_matte(model, video_wait, prewarm):
+    """在子进程中运行：模拟等待视频后抠第一帧，打印首帧抠图耗时"""
+    import numpy as np
+    from src.frame_processor import FrameProcessor
+
+    processor = FrameProcessor(config={'frame_processing': {'batch_size': 1, 'refinement': 'none'}})
+    if prewarm:
+        processor.prewarm(model)
+    time.sleep(video_wait)
+
+    frame = np.random.default_rng(0).integers(0, 256, (1280, 720, 3), dtype=np.uint8)
+    start = time.perf_counter()
+    if not prewarm:
+        processor.set_model(model)
+    next(processor._iter_remove_background([frame]))
+    print(f"{time.perf_counter() - start:.3f}")
+
+
+def time_first_matte(model, video_wait, prewarm):
+    code = (f"import sys; sys.argv = ['bench']; from benchmarks.bench_startup import first_matte; "
+            f"first_matte({model!r}, {video_wait}, {prewarm})")
+    output = subprocess.run([sys.executable, '-c', code], cwd=ROOT, check=True,
+                            capture_output=True, text=True).stdout
+    return float(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="启动耗时与首帧抠图耗时")
+    parser.add_argument('--model', default='isnet-anime')
+    parser.add_argument('--video-wait', type=float, default=5)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    print("启动耗时（到显示第一个提示）:")
+    for label, code in (('启动时全部导入', EAGER_IMPORTS), ('按需导入', LAZY_IMPORTS)):
+        best = min(time_subprocess(code) for _ in range(args.repeat))
+        print(f"  {label:<16}{best:>8.2f}s")
+
+    print(f"\n首帧抠图耗时（视频到达后，模型 {args.model}，等待视频 {args.video_wait:g}s）:")
+    for label, prewarm in (('视频到达后加载', False), ('后台预加载', True)):
+        best = min(time_first_matte(args.model, args.video_wait, prewarm) for _ in range(args.repeat))
+        print(f"  {label:<16}{best:>8.2f}s")
+
+
+if __name__ == "__main__":
+    main()
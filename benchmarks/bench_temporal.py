@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+增量抠图质量与速度检查：逐帧整帧推理 vs 时域复用
+
+用法:
+    python benchmarks/bench_temporal.py <视频路径> [--model isnet-anime] [--frames 48]
+输出跳过的推理次数、耗时，以及与整帧推理结果的alpha误差和前景IoU
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+from rembg import new_session
+
+from src.matting import MattingEngine
+from bench_matting import load_frames
+
+
+def compare(reference, candidate):
+    """比较两组RGBA结果的alpha通道"""
+    errors = []
+    ious = []
+    for ref, cand in zip(reference, candidate):
+        ref_alpha = ref[..., 3].astype(np.float32)
+        cand_alpha = cand[..., 3].astype(np.float32)
+        errors.append(np.abs(ref_alpha - cand_alpha).mean())
+
+        ref_fg = ref_alpha > 127
+        cand_fg = cand_alpha > 127
+        union = np.logical_or(ref_fg, cand_fg).sum()
+        ious.append(np.logical_and(ref_fg, cand_fg).sum() / union if union else 1.0)
+    return np.array(errors), np.array(ious)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="增量抠图质量检查")
+    parser.add_argument('video', help="输入视频路径")
+    parser.add_argument('--model', default='isnet-anime')
+    parser.add_argument('--frames', type=int, default=48)
+    parser.add_argument('--batch-size', type=int, default=8)
+    args = parser.parse_args()
+
+    frames = load_frames(args.video, args.frames, None)
+    session = new_session(args.model)
+
+    full_engine = MattingEngine(session, args.model, args.batch_size)
+    start = time.perf_counter()
+    reference = list(full_engine.process(frames))
+    full_time = time.perf_counter() - start
+
+    temporal_engine = MattingEngine(session, args.model, args.batch_size, temporal={'enabled': True})
+    start = time.perf_counter()
+    candidate = list(temporal_engine.process(frames))
+    temporal_time = time.perf_counter() - start
+
+    stats = temporal_engine.stats
+    errors, ious = compare(reference, candidate)
+
+    print(f"帧数: {len(frames)}")
+    print(f"整帧推理: {full_time:.2f}s")
+    print(f"增量抠图: {temporal_time:.2f}s  (整帧 {stats['inferred']} / 局部 {stats['region']} / 跳过 {stats['reused']})")
+    print(f"alpha平均误差: {errors.mean():.2f}  最大: {errors.max():.2f}  (0-255)")
+    print(f"前景IoU平均: {ious.mean():.4f}  最低: {ious.min():.4f}")
+
+
+if __name__ == "__main__":
+    main()
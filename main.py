@@ -1,6 +1,13 @@
 #!/usr/bin/env python3
+import time
+_START_TIME = time.perf_counter()
+
+import argparse
+import importlib
+import itertools
 import os
 import sys
+import threading
 from datetime import datetime
 from dotenv import load_dotenv
 
@@ -18,10 +25,22 @@ if not os.environ.get("ARK_API_KEY"):
     print("提示: 复制 .env.example 为 .env 并填入你的API密钥")
     sys.exit(1)
 
-from src.prompt_enhancer import PromptEnhancer
-from src.image_generator import ImageGenerator
-from src.video_generator import VideoGenerator
-from src.frame_processor import FrameProcessor
+from src.job_journal import JobJournal
+
+# 较重的模块（openai、火山引擎SDK、cv2、rembg/onnxruntime）在用到时才导入，
+# 程序启动后立即显示提示；API客户端模块在用户输入期间由后台线程提前导入
+_API_MODULES = ['src.prompt_enhancer', 'src.image_generator', 'src.video_generator']
+
+def preload_modules(names):
+    """在后台线程导入模块，之后的import语句会等待导入完成而不会重复导入"""
+    def load():
+        for name in names:
+            try:
+                importlib.import_module(name)
+            except Exception:
+                # 导入错误留给真正使用时的import语句报告
+                pass
+    threading.Thread(target=load, daemon=True).start()
 
 def display_images(image_paths):
     """显示生成的图片路径供用户查看"""
@@ -114,12 +133,21 @@ def select_rembg_model(config):
         except ValueError:
             print("请输入有效的数字")
 
-def create_session_directory(base_config):
-    """创建本次运行的时间戳目录"""
+def default_rembg_model(config):
+    """未选择时使用的抠图模型（与 select_rembg_model 的默认值一致）"""
+    model_list = list(config.get('rembg_models', {}).keys())
+    if 'isnet-anime' in model_list or not model_list:
+        return 'isnet-anime'
+    return model_list[0]
+
+def create_session_directory(base_config, session_name=None):
+    """创建本次运行的时间戳目录，指定session_name时沿用已有会话的目录"""
     import copy
     
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    session_name = f"session_{timestamp}"
+    resuming = session_name is not None
+    if not resuming:
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        session_name = f"session_{timestamp}"
     
     # 深拷贝配置
     updated_config = copy.deepcopy(base_config)
@@ -133,79 +161,198 @@ def create_session_directory(base_config):
     for path in updated_config['output_paths'].values():
         os.makedirs(path, exist_ok=True)
     
-    print(f"📁 本次运行输出目录: ./output/{session_name}/")
+    if resuming:
+        print(f"📁 继续会话: ./output/{session_name}/")
+    else:
+        print(f"📁 本次运行输出目录: ./output/{session_name}/")
     
     return updated_config, session_name
 
+def parse_args():
+    parser = argparse.ArgumentParser(description="序列帧动画生成器")
+    parser.add_argument('--resume', metavar='SESSION',
+                        help="从中断的会话继续，例如 session_20250101_120000")
+    parser.add_argument('--batch', metavar='MANIFEST',
+                        help="按任务清单批量生成，不需要交互，例如 manifest.json")
+    return parser.parse_args()
+
+def run_batch(manifest_path, base_config):
+    """批量模式：按任务清单处理所有角色 × 动作 × 抠图模型"""
+    from src.batch_runner import BatchRunner, load_manifest
+    
+    try:
+        manifest = load_manifest(manifest_path)
+    except (OSError, ValueError) as e:
+        print(f"❌ 错误: 无法读取任务清单 {manifest_path}: {e}")
+        sys.exit(1)
+    
+    updated_config, session_name = create_session_directory(base_config)
+    jobs = sum(len(c['actions']) * len(c['models']) for c in manifest['characters'])
+    print(f"📋 批量任务: {len(manifest['characters'])} 个角色，共 {jobs} 个精灵图\n")
+    
+    try:
+        results = BatchRunner(updated_config, manifest, session_name).run()
+    except KeyboardInterrupt:
+        print("\n\n已取消操作")
+        sys.exit(0)
+    
+    failed = [r for r in results if not r['sprite_path']]
+    print(f"\n📁 所有文件已保存到: ./output/{session_name}/")
+    sys.exit(1 if failed else 0)
+
 def main():
-    print("🎬 序列帧动画生成器\n")
+    args = parse_args()
+    print(f"🎬 序列帧动画生成器 (启动用时 {time.perf_counter() - _START_TIME:.2f}秒)\n")
     
     # 初始化各个模块（先加载配置）
     import json
     with open('config.json', 'r') as f:
         base_config = json.load(f)
     
+    if args.batch:
+        run_batch(args.batch, base_config)
+        return
+    
+    # 恢复模式下会话必须已有作业日志
+    resume = args.resume.strip('/').split('/')[-1] if args.resume else None
+    if resume and not os.path.exists(os.path.join('./output', resume, 'journal.jsonl')):
+        print(f"❌ 错误: 找不到会话 {resume} 的作业日志")
+        sys.exit(1)
+    
     # 创建本次运行的目录
-    updated_config, session_name = create_session_directory(base_config)
+    updated_config, session_name = create_session_directory(base_config, resume)
     
-    # 使用更新后的配置初始化模块
-    enhancer = PromptEnhancer()
-    image_gen = ImageGenerator()
-    video_gen = VideoGenerator() 
-    frame_proc = FrameProcessor()
+    # 作业日志：记录每个阶段的结果，中断后可用 --resume 继续
+    journal = JobJournal(os.path.join('./output', session_name, 'journal.jsonl'))
     
-    # 更新各模块的配置
-    image_gen.config = updated_config
-    video_gen.config = updated_config
-    frame_proc.config = updated_config
+    preload_modules(_API_MODULES)
     
     try:
         # 步骤1: 用户输入
-        user_input = input("[1] 请输入角色描述: ")
-        print("    ✓ 正在优化提示词...")
+        enhanced_prompt = journal.get('enhanced_prompt')
+        if enhanced_prompt is None:
+            user_input = input("[1] 请输入角色描述: ")
+            print("    ✓ 正在优化提示词...")
+            
+            # 润色提示词
+            from src.prompt_enhancer import PromptEnhancer
+            enhancer = PromptEnhancer()
+            enhanced_prompt = enhancer.enhance(user_input)
+            journal.record('prompt_enhanced', user_input=user_input, enhanced_prompt=enhanced_prompt)
+        else:
+            print(f"[1] ↺ 已恢复角色描述: {journal.get('user_input')}")
         
-        # 润色提示词
-        enhanced_prompt = enhancer.enhance(user_input)
+        # 使用更新后的配置初始化模块
+        from src.image_generator import ImageGenerator
+        from src.video_generator import VideoGenerator
+        image_gen = ImageGenerator()
+        video_gen = VideoGenerator()
+        image_gen.config = updated_config
+        video_gen.config = updated_config
+        video_gen.journal = journal
         
         # 步骤2: 生成图片
-        print("\n[2] 正在生成图片... (1:1, 4张)")
-        image_paths = image_gen.generate(enhanced_prompt)
+        image_paths = journal.get('image_paths')
+        if not image_paths or not all(os.path.exists(path) for path in image_paths):
+            print("\n[2] 正在生成图片... (1:1, 4张)")
+            image_paths = image_gen.generate(enhanced_prompt)
+            journal.record('images_generated', image_paths=image_paths)
         
         # 用户选择图片
-        selected_image = display_images(image_paths)
+        selected_image = journal.get('selected_image')
+        if not selected_image or not os.path.exists(selected_image):
+            selected_image = display_images(image_paths)
+            journal.record('image_selected', image_path=selected_image)
+        else:
+            print(f"\n[2] ↺ 已恢复选择的图片: {os.path.basename(selected_image)}")
         
         # 步骤3: 选择动作
-        selected_actions = select_actions(updated_config)
+        selected_actions = journal.get('actions')
+        if not selected_actions:
+            selected_actions = select_actions(updated_config)
+            journal.record('actions_selected', actions=selected_actions)
+        else:
+            print(f"\n[3] ↺ 已恢复选择的动作: {', '.join(selected_actions)}")
         
-        # 步骤4: 生成视频
-        print(f"\n[4] 正在并发生成{len(selected_actions)}个动画视频... (每个5秒)")
+        # 恢复时跳过已生成精灵图的动作，已下载的视频直接复用
+        pending_actions = [action for action in selected_actions if not journal.sprite(action)]
+        existing_videos = {action: journal.video(action) for action in pending_actions
+                           if journal.video(action)}
+        missing_actions = [action for action in pending_actions if action not in existing_videos]
+        if resume:
+            print(f"    待处理动作: {len(pending_actions)}，需要生成视频: {len(missing_actions)}")
         
-        # 获取选中图片的base64格式
-        image_base64 = image_gen.get_image_base64(selected_image)
+        # 流式模式：视频下载完成后立即抠图，与其余视频的生成过程重叠
+        streaming = updated_config.get('pipeline', {}).get('streaming', False)
         
-        # 并发生成视频
-        video_results = video_gen.generate_multiple_videos(image_base64, selected_actions)
+        # 帧处理模块（cv2、rembg）到这里才导入
+        from src.frame_processor import FrameProcessor
+        frame_proc = FrameProcessor(config=updated_config)
+        frame_proc.journal = journal
         
-        # 确认视频
-        confirm = confirm_videos(video_results)
+        prewarm = updated_config.get('frame_processing', {}).get('prewarm', True)
         
-        if confirm == 'r':
-            print("重新生成功能待实现...")
-            return
-        elif confirm == 'n':
-            print("已取消")
-            return
+        selected_model = journal.get('model')
+        if streaming and pending_actions:
+            # 步骤5需提前：处理开始前必须确定抠图模型
+            if not selected_model:
+                selected_model = select_rembg_model(frame_proc.config)
+                journal.record('model_selected', model=selected_model)
+            if not prewarm:
+                frame_proc.use_model(selected_model)
         
-        # 步骤5: 选择抠图模型
-        selected_model = select_rembg_model(frame_proc.config)
-        frame_proc.set_model(selected_model)
+        # 视频生成期间在后台加载抠图模型（未选择时先加载默认模型），第一个视频到达即可开始抠图
+        if pending_actions and prewarm:
+            frame_proc.prewarm(selected_model or default_rembg_model(updated_config))
         
-        # 步骤6: 处理视频生成精灵表
-        print("\n[6] 正在批量处理视频并生成精灵表...")
+        # 步骤4: 生成视频
+        video_results = dict(existing_videos)
+        if missing_actions:
+            print(f"\n[4] 正在并发生成{len(missing_actions)}个动画视频... (每个5秒)")
+            
+            # 获取选中图片的base64格式
+            image_base64 = image_gen.get_image_base64(selected_image)
         
-        for action, video_path in video_results.items():
-            if video_path and os.path.exists(video_path):
-                frame_proc.process_video(video_path, action)
+        if streaming and pending_actions:
+            # 步骤6: 每个视频完成后立即生成精灵表
+            print("    每个视频下载完成后将立即生成精灵表")
+            progressive = updated_config.get('pipeline', {}).get('progressive_ingest', False)
+            video_stream = existing_videos.items()
+            if missing_actions:
+                video_stream = itertools.chain(
+                    video_stream, video_gen.iter_videos(image_base64, missing_actions, progressive)
+                )
+            frame_proc.process_videos(video_stream)
+        elif pending_actions:
+            # 并发生成视频
+            if missing_actions:
+                video_results.update(video_gen.generate_multiple_videos(image_base64, missing_actions))
+            video_results = {action: video_results.get(action) for action in pending_actions}
+            
+            # 确认视频
+            confirm = confirm_videos(video_results)
+            
+            if confirm == 'r':
+                print("重新生成功能待实现...")
+                return
+            elif confirm == 'n':
+                print("已取消")
+                return
+            
+            # 步骤5: 选择抠图模型
+            if not selected_model:
+                selected_model = select_rembg_model(frame_proc.config)
+                journal.record('model_selected', model=selected_model)
+            if prewarm:
+                # 与预加载的模型不同时在后台加载，与第一个视频的解码重叠
+                frame_proc.prewarm(selected_model)
+            else:
+                frame_proc.use_model(selected_model)
+            
+            # 步骤6: 处理视频生成精灵表
+            print("\n[6] 正在批量处理视频并生成精灵表...")
+            
+            frame_proc.process_videos(video_results.items())
         
         print("\n✅ 所有动画处理完成！")
         print(f"\n📁 所有文件已保存到: ./output/{session_name}/")
@@ -44,14 +44,22 @@ class AnimationPreview:
                 config = json.load(f)
             
             action_name = config['name']
-            sprite_path = config_file.replace('_sprite_config.json', '_sprite_sheet.png')
+            # 多页输出按pages依次加载，单页输出只有一张精灵图
+            config_dir = os.path.dirname(config_file)
+            if 'pages' in config:
+                sprite_paths = [os.path.join(config_dir, page) for page in config['pages']]
+            elif 'image' in config:
+                sprite_paths = [os.path.join(config_dir, config['image'])]
+            else:
+                sprite_paths = [config_file.replace('_sprite_config.json', '_sprite_sheet.png')]
             
-            if os.path.exists(sprite_path):
-                # 加载sprite sheet
-                sprite_image = Image.open(sprite_path)
+            if all(os.path.exists(path) for path in sprite_paths):
+                # 加载sprite sheet（调色板PNG等统一转换为RGBA）
+                sprite_images = [Image.open(path).convert('RGBA') for path in sprite_paths]
                 
                 # 解析帧
-                frames = self.extract_frames(sprite_image, config)
+                frames = self.extract_frames(sprite_images, config)
+                frames = self.expand_sequence(frames, config)
                 
                 # 计算帧延迟
                 fps = config.get('fps', 10)
@@ -63,26 +71,13 @@ class AnimationPreview:
                     'delay': delay
                 }
     
-    def extract_frames(self, sprite_sheet, config):
+    def extract_frames(self, sprite_sheets, config):
         """从sprite sheet中提取帧"""
         frames = []
         frame_width = config['frame_width']
         frame_height = config['frame_height']
-        frames_per_row = config['frames_per_row']
-        frame_count = config['frame_count']
         
-        for i in range(frame_count):
-            row = i // frames_per_row
-            col = i % frames_per_row
-            
-            # 计算帧位置（考虑padding）
-            padding = 2  # 从配置中的padding
-            x = col * (frame_width + padding)
-            y = row * (frame_height + padding)
-            
-            # 裁剪帧
-            frame = sprite_sheet.crop((x, y, x + frame_width, y + frame_height))
-            
+        for frame in self.crop_frames(sprite_sheets, config):
             # 缩放到合适的显示大小，保持宽高比
             max_display_size = 400  # 最大显示尺寸
             
@@ -100,6 +95,45 @@ class AnimationPreview:
         
         return frames
     
+    def crop_frames(self, sprite_sheets, config):
+        """按布局从sprite sheet（多页时为各页列表）裁剪出原始尺寸的帧"""
+        frame_width = config['frame_width']
+        frame_height = config['frame_height']
+        sprite_sheet = sprite_sheets[0]
+        
+        if 'frames' in config:
+            # 图集或多页布局：按记录的页和矩形裁剪，再放回原帧中的位置
+            for rect in config['frames']:
+                sheet = sprite_sheets[rect.get('page', 0)]
+                crop = sheet.crop((rect['x'], rect['y'],
+                                   rect['x'] + rect['w'], rect['y'] + rect['h']))
+                frame = Image.new('RGBA', (frame_width, frame_height), (0, 0, 0, 0))
+                frame.paste(crop, (rect['offset_x'], rect['offset_y']))
+                yield frame
+            return
+        
+        frames_per_row = config['frames_per_row']
+        frame_count = config['frame_count']
+        
+        for i in range(frame_count):
+            row = i // frames_per_row
+            col = i % frames_per_row
+            
+            # 计算帧位置（考虑padding）
+            padding = 2  # 从配置中的padding
+            x = col * (frame_width + padding)
+            y = row * (frame_height + padding)
+            
+            # 裁剪帧
+            yield sprite_sheet.crop((x, y, x + frame_width, y + frame_height))
+    
+    def expand_sequence(self, frames, config):
+        """按frame_sequence把去重后的格子还原为完整的动画帧序列"""
+        frame_sequence = config.get('frame_sequence')
+        if not frame_sequence:
+            return frames
+        return [frames[cell] for cell in frame_sequence]
+    
     def create_ui(self):
         """创建用户界面"""
         # 顶部控制区
@@ -269,9 +303,10 @@ class AnimationPreview:
             anim = self.animations[self.current_animation]
             config = anim['config']
             info = f"动作: {self.current_animation} | "
-            info += f"帧数: {config['frame_count']} | "
+            frame_count = len(anim['frames'])
+            info += f"帧数: {frame_count} | "
             info += f"FPS: {config['fps']} | "
-            info += f"当前帧: {self.current_frame + 1}/{config['frame_count']}"
+            info += f"当前帧: {self.current_frame + 1}/{frame_count}"
             self.info_label.configure(text=info)
     
     def draw_grid(self):
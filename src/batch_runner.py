@@ -0,0 +1,324 @@
+import asyncio
+import copy
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from .prompt_enhancer import PromptEnhancer
+from .image_generator import ImageGenerator
+from .video_engine import AsyncVideoEngine
+from .frame_processor import FrameProcessor
+from .session_pool import get_session_pool
+
+# 流水线各阶段及默认并发数
+#   enhance: 润色提示词（每个角色一次；开启 prompt_enhancement.batch 时按 max_size 合并请求）
+#   images : 生成角色图（每个角色一次）
+#   videos : 视频任务（每个角色 x 动作），在途任务数同时受 video_settings.concurrency 限制
+#   matting: 提帧与抠图（每个角色 x 动作 x 抠图模型），各线程共用会话池中的模型会话
+#   sheets : 拼接并编码精灵图
+STAGES = ('enhance', 'images', 'videos', 'matting', 'sheets')
+DEFAULT_STAGE_LIMITS = {
+    'enhance': 4,
+    'images': 2,
+    'videos': 20,
+    'matting': 1,
+    'sheets': 2,
+}
+
+
+def load_manifest(path):
+    """读取批量任务清单
+
+    格式:
+        {
+          "characters": [
+            {"name": "knight", "description": "穿盔甲的骑士", "image_index": 1,
+             "actions": ["run"], "models": ["isnet-anime"]}
+          ],
+          "actions": ["idle", "run"],        // 角色未指定时使用
+          "models": ["isnet-anime"],         // 角色未指定时使用
+          "stage_limits": {"videos": 50}     // 覆盖各阶段并发数
+        }
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+
+    characters = manifest.get('characters', [])
+    if not characters:
+        raise ValueError("任务清单中没有角色")
+    for index, character in enumerate(characters):
+        if not character.get('description'):
+            raise ValueError(f"第{index + 1}个角色缺少 description")
+        character.setdefault('name', f"character_{index + 1}")
+        character.setdefault('actions', manifest.get('actions'))
+        character.setdefault('models', manifest.get('models') or ['isnet-anime'])
+        character.setdefault('image_index', 1)
+        if not character['actions']:
+            raise ValueError(f"角色 {character['name']} 没有指定动作")
+    return manifest
+
+
+class StageStats:
+    """单个阶段的吞吐统计"""
+
+    def __init__(self, name, workers):
+        self.name = name
+        self.workers = workers
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.busy = 0.0
+        self.first_start = None
+        self.last_end = None
+        self._lock = threading.Lock()
+
+    def record(self, start, end, ok):
+        with self._lock:
+            self.busy += end - start
+            self.first_start = start if self.first_start is None else min(self.first_start, start)
+            self.last_end = end if self.last_end is None else max(self.last_end, end)
+            if ok:
+                self.completed += 1
+            else:
+                self.failed += 1
+
+    def summary(self):
+        span = (self.last_end - self.first_start) if self.first_start is not None else 0.0
+        done = self.completed + self.failed
+        return {
+            'stage': self.name,
+            'workers': self.workers,
+            'completed': self.completed,
+            'failed': self.failed,
+            'wall_seconds': span,
+            'throughput_per_min': done / span * 60 if span > 0 else 0.0,
+            'mean_seconds': self.busy / done if done else 0.0,
+            # 忙碌时间占 (并发数 x 阶段持续时间) 的比例，接近100%说明该阶段是瓶颈
+            'utilization': self.busy / (span * self.workers) if span > 0 else 0.0,
+        }
+
+
+class BatchRunner:
+    """无交互的批量流水线：enhance → images → videos → matting → sheets
+
+    每个阶段有独立的线程池（视频阶段为一个asyncio事件循环），上一阶段的某个任务完成后
+    立即把后续任务提交到下一阶段，慢阶段只会积压自己的队列，不会阻塞其他阶段。
+    """
+
+    def __init__(self, config, manifest, session_name):
+        self.config = config
+        self.manifest = manifest
+        self.session_name = session_name
+
+        limits = dict(DEFAULT_STAGE_LIMITS)
+        limits.update(manifest.get('stage_limits', {}))
+        self.stats = {stage: StageStats(stage, limits[stage]) for stage in STAGES}
+        self._pools = {stage: ThreadPoolExecutor(max_workers=limits[stage], thread_name_prefix=stage)
+                       for stage in STAGES if stage != 'videos'}
+
+        self.enhancer = PromptEnhancer()
+        self.enhancer.config = config
+
+        # 视频阶段：后台线程上的事件循环，所有视频任务共用一个引擎
+        video_config = copy.deepcopy(config)
+        concurrency = video_config['video_settings'].setdefault('concurrency', {})
+        concurrency['max_tasks'] = min(concurrency.get('max_tasks', limits['videos']), limits['videos'])
+        self._loop = asyncio.new_event_loop()
+        self._loop_thread = threading.Thread(target=self._loop.run_forever, name="videos", daemon=True)
+        self._engine = None
+        self._video_config = video_config
+
+        # 图片阶段、抠图阶段每个线程一个生成器/处理器；抠图模型会话由进程内的会话池共享
+        self._local = threading.local()
+
+        self.results = []
+        self._outstanding = 0
+        self._done = threading.Condition()
+
+    def run(self):
+        """执行整个清单，阻塞直到所有任务结束，返回结果列表"""
+        self._loop_thread.start()
+        self._engine = asyncio.run_coroutine_threadsafe(self._create_engine(), self._loop).result()
+
+        start = time.time()
+        # 开启 prompt_enhancement.batch 时，多个角色的润色合并为一次请求
+        batch_config = self.config['prompt_enhancement'].get('batch', {})
+        group_size = batch_config.get('max_size', 20) if batch_config.get('enabled', False) else 1
+        characters = self.manifest['characters']
+        for index in range(0, len(characters), group_size):
+            self._submit('enhance', {'characters': characters[index:index + group_size]}, self._enhance)
+
+        with self._done:
+            while self._outstanding:
+                self._done.wait()
+
+        asyncio.run_coroutine_threadsafe(self._engine.close(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._loop_thread.join()
+        for pool in self._pools.values():
+            pool.shutdown()
+
+        self._report(time.time() - start)
+        return self.results
+
+    # ---- 各阶段 ----
+
+    def _enhance(self, job):
+        characters = job['characters']
+        prompts = self.enhancer.enhance_batch([character['description'] for character in characters])
+        for character, prompt in zip(characters, prompts):
+            self._submit('images', {'character': character}, self._images, prompt)
+
+    def _images(self, job, prompt):
+        character = job['character']
+        image_gen = self._image_generator()
+        image_gen.config = self._character_config(character)
+        image_paths = image_gen.generate(prompt)
+        index = min(max(character['image_index'], 1), len(image_paths)) - 1
+        image_base64 = image_gen.get_image_base64(image_paths[index])
+
+        for action in character['actions']:
+            self._submit('videos', dict(job, action=action), self._video, image_base64)
+
+    def _video(self, job, image_base64):
+        """在事件循环中提交视频任务，返回concurrent.futures.Future"""
+        filename = os.path.join(job['character']['name'], f"{job['action']}.mp4")
+        return asyncio.run_coroutine_threadsafe(
+            self._engine.generate(image_base64, job['action'], filename), self._loop
+        )
+
+    def _after_video(self, job, video_path):
+        for model in job['character']['models']:
+            self._submit('matting', dict(job, model=model), self._matting, video_path)
+
+    def _matting(self, job, video_path):
+        processor = self._processor()
+        processor.config = self._character_config(job['character'], job['model'])
+        processor.set_model(job['model'])
+        frames = processor.extract_frames(video_path, job['action'])
+        processed = processor.remove_background(frames, job['action'])
+        self._submit('sheets', job, self._sheets, processed, processor.source_info)
+
+    def _sheets(self, job, processed, source_info):
+        processor = FrameProcessor(config=self._character_config(job['character'], job['model']))
+        processor.source_info = source_info
+        sprite_path = processor.create_sprite_sequence(processed, job['action'])
+        self._add_result(job, sprite_path, None)
+
+    # ---- 调度 ----
+
+    def _submit(self, stage, job, func, *args):
+        """提交任务到指定阶段；任务失败只跳过该角色/动作/模型的后续阶段"""
+        stats = self.stats[stage]
+        with self._done:
+            self._outstanding += 1
+            stats.submitted += 1
+        names = ','.join(character['name'] for character in self._characters(job))
+        label = '/'.join(filter(None, (names, job.get('action'), job.get('model'))))
+        start = [time.time()]
+
+        def finish(error=None):
+            stats.record(start[0], time.time(), error is None)
+            if error is None:
+                print(f"  ✓ [{stage}] {label} ({stats.completed}/{stats.submitted})")
+            else:
+                print(f"  ✗ [{stage}] {label}: {error}")
+                self._add_result(job, None, f"{stage}: {error}")
+            with self._done:
+                self._outstanding -= 1
+                self._done.notify_all()
+
+        if stage == 'videos':
+            def on_video(future):
+                try:
+                    video_path = future.result()
+                except Exception as e:
+                    finish(e)
+                    return
+                # 先提交后续任务再结束本任务，未完成计数不会提前归零
+                self._after_video(job, video_path)
+                finish()
+
+            func(job, *args).add_done_callback(on_video)
+            return
+
+        def task():
+            start[0] = time.time()
+            try:
+                func(job, *args)
+            except Exception as e:
+                finish(e)
+            else:
+                finish()
+
+        self._pools[stage].submit(task)
+
+    def _add_result(self, job, sprite_path, error):
+        with self._done:
+            for character in self._characters(job):
+                self.results.append({
+                    'character': character['name'],
+                    'action': job.get('action'),
+                    'model': job.get('model'),
+                    'sprite_path': sprite_path,
+                    'error': error,
+                })
+
+    @staticmethod
+    def _characters(job):
+        """润色阶段的任务包含一组角色，之后的阶段每个任务对应一个角色"""
+        return job['characters'] if 'characters' in job else [job['character']]
+
+    # ---- 辅助 ----
+
+    async def _create_engine(self):
+        return AsyncVideoEngine(self._video_config)
+
+    def _image_generator(self):
+        if getattr(self._local, 'image_gen', None) is None:
+            self._local.image_gen = ImageGenerator()
+        return self._local.image_gen
+
+    def _processor(self):
+        if getattr(self._local, 'processor', None) is None:
+            self._local.processor = FrameProcessor(config=self.config)
+        return self._local.processor
+
+    def _character_config(self, character, model=None):
+        """角色（和抠图模型）各自的输出目录"""
+        config = copy.copy(self.config)
+        paths = dict(config['output_paths'])
+        paths['images'] = os.path.join(paths['images'], character['name'], '')
+        sprites = os.path.join(paths['sprites'], character['name'])
+        if model and len(character['models']) > 1:
+            sprites = os.path.join(sprites, model)
+        paths['sprites'] = os.path.join(sprites, '')
+        config['output_paths'] = paths
+        return config
+
+    def _report(self, elapsed):
+        """打印各阶段吞吐并保存结果"""
+        print(f"\n📊 批量处理完成 (总用时 {elapsed:.0f}秒)")
+        print(f"  {'阶段':<10}{'并发':>6}{'完成':>6}{'失败':>6}{'平均耗时':>10}{'吞吐(个/分)':>12}{'利用率':>8}")
+        summaries = []
+        for stage in STAGES:
+            summary = self.stats[stage].summary()
+            summaries.append(summary)
+            print(f"  {stage:<10}{summary['workers']:>6}{summary['completed']:>6}{summary['failed']:>6}"
+                  f"{summary['mean_seconds']:>9.1f}s{summary['throughput_per_min']:>12.2f}"
+                  f"{summary['utilization']:>8.0%}")
+
+        sprites = [r for r in self.results if r['sprite_path']]
+        print(f"  精灵图: {len(sprites)} 个成功，{len(self.results) - len(sprites)} 个失败")
+
+        pool_stats = get_session_pool().stats()
+        print(f"  抠图模型: 加载 {pool_stats['loads']} 次（{pool_stats['load_seconds']:.1f}秒），"
+              f"复用 {pool_stats['hits']} 次，淘汰 {pool_stats['evictions']} 次")
+
+        summary_path = os.path.join('./output', self.session_name, 'batch_summary.json')
+        os.makedirs(os.path.dirname(summary_path), exist_ok=True)
+        with open(summary_path, 'w', encoding='utf-8') as f:
+            json.dump({'elapsed_seconds': elapsed, 'stages': summaries, 'sessions': pool_stats,
+                       'results': self.results}, f, ensure_ascii=False, indent=2)
+        print(f"  结果已保存到: {summary_path}")
@@ -0,0 +1,281 @@
+import hashlib
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import HTTPError as Urllib3Error
+
+# 默认下载参数
+#   min_chunk / max_chunk: 自适应读取块大小的范围（字节）
+#   parallel_threshold_mb: 文件不小于该值且服务器支持Range时分段并行下载，为0时关闭
+#   parallel_segments    : 并行下载的分段数
+#   retries              : 连续无进展时的最大重试次数（从已下载的位置续传）
+#   pool_size            : 连接池大小
+#   timeout              : 连接和读取超时（秒）
+DEFAULT_OPTIONS = {
+    'min_chunk': 64 * 1024,
+    'max_chunk': 4 * 1024 * 1024,
+    'parallel_threshold_mb': 16,
+    'parallel_segments': 4,
+    'retries': 3,
+    'pool_size': 16,
+    'timeout': 60,
+}
+
+# 单次读取耗时低于该值时加大块，高于_SLOW_READ时减小块
+_FAST_READ = 0.05
+_SLOW_READ = 0.5
+
+_CONTENT_RANGE = re.compile(r'bytes (\d+)-(\d+)/(\d+|\*)')
+
+
+class DownloadError(Exception):
+    pass
+
+
+# 可以通过重试或续传恢复的错误（直接读取response.raw时抛出的是urllib3的异常）
+_RETRYABLE = (requests.RequestException, Urllib3Error, OSError, DownloadError)
+
+
+class Downloader:
+    """带连接池的文件下载器
+
+    - 所有下载共用一个requests.Session，复用TCP/TLS连接
+    - 读取块大小按实际吞吐自适应调整
+    - 先写入 <目标>.part，完成并校验后原子重命名，目标路径上不会出现残缺文件
+    - 出错时按HTTP Range从本次已下载的位置续传（不沿用之前遗留的.part文件）
+    - 大文件可以按字节范围分段并行下载
+    """
+
+    def __init__(self, options=None):
+        self.options = dict(DEFAULT_OPTIONS)
+        if options:
+            self.options.update(options)
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=self.options['pool_size'],
+                              pool_maxsize=self.options['pool_size'])
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def download(self, url, output_path, expected_size=None, checksum=None, timeout=None,
+                 on_data=None):
+        """下载到output_path，返回写入的字节数
+
+        Args:
+            expected_size: 期望的文件大小，不一致时视为失败
+            checksum: 期望的校验值，格式为 "算法:十六进制"，例如 "sha256:ab12..."
+            timeout: 覆盖默认的连接和读取超时
+            on_data: 每写入一块数据后调用 on_data(文件偏移, 数据)；指定时不做分段并行，
+                数据按文件顺序到达（续传时偏移可能回退，由调用方按偏移去重）
+        """
+        os.makedirs(os.path.dirname(output_path) or '.', exist_ok=True)
+        part_path = output_path + '.part'
+        timeout = timeout or self.options['timeout']
+
+        # 只续传本次调用中写入的数据：已有的.part可能来自另一个URL（例如已过期的任务
+        # 重新生成后写入同一路径），拼接后大小仍然一致但内容错误
+        if os.path.exists(part_path):
+            os.remove(part_path)
+
+        try:
+            total = self._download_with_retries(url, part_path, timeout, on_data)
+
+            size = os.path.getsize(part_path)
+            if total is not None and size != total:
+                raise DownloadError(f"文件大小不一致: 已下载 {size} 字节，服务器报告 {total} 字节")
+            if expected_size is not None and size != expected_size:
+                raise DownloadError(f"文件大小不一致: 已下载 {size} 字节，期望 {expected_size} 字节")
+            if checksum:
+                self._verify_checksum(part_path, checksum)
+        except Exception:
+            # 最终失败时不留下.part文件（下次下载也不会续传它）
+            if os.path.exists(part_path):
+                os.remove(part_path)
+            raise
+
+        os.replace(part_path, output_path)
+        return size
+
+    def _download_with_retries(self, url, part_path, timeout, on_data=None):
+        """下载到.part文件，返回服务器报告的总大小（未知时为None）"""
+        total = None
+        # 需要按顺序回调数据时不探测Range，直接单连接下载
+        ranges_supported = False if on_data else None
+        last_error = None
+
+        failures = 0  # 没有任何进展的连续失败次数
+        while True:
+            offset = self._offset(part_path)
+            try:
+                # 首次下载大文件时尝试分段并行
+                if offset == 0 and ranges_supported is None:
+                    total, ranges_supported = self._probe(url, timeout)
+                    threshold = self.options['parallel_threshold_mb'] * 1024 * 1024
+                    if ranges_supported and total and threshold and total >= threshold:
+                        try:
+                            self._download_parallel(url, part_path, total, timeout)
+                            return total
+                        except Exception:
+                            # 预分配的文件中有空洞，无法续传：删除后改为单连接下载
+                            os.remove(part_path)
+                            ranges_supported = False
+                            raise
+
+                reported = self._download_stream(url, part_path, offset, timeout, on_data)
+                return reported if reported is not None else total
+            except _RETRYABLE as e:
+                last_error = e
+
+            # 本次有新数据写入时重新计数，只有连续无进展的失败才会耗尽重试次数
+            failures = 1 if self._offset(part_path) > offset else failures + 1
+            if failures > self.options['retries']:
+                break
+            time.sleep(min(2 ** (failures - 1), 10))
+            print(f"  下载中断，从 {self._offset(part_path)} 字节处续传: {last_error}")
+
+        raise DownloadError(f"下载失败: {last_error}")
+
+    def _probe(self, url, timeout):
+        """请求第一个字节，得到 (总大小, 是否支持Range)"""
+        with self.session.get(url, headers={'Range': 'bytes=0-0'}, stream=True, timeout=timeout) as response:
+            response.raise_for_status()
+            if response.status_code == 206:
+                match = _CONTENT_RANGE.match(response.headers.get('Content-Range', ''))
+                if match and match.group(3) != '*':
+                    return int(match.group(3)), True
+            length = response.headers.get('Content-Length')
+            return (int(length) if length and response.status_code == 200 else None), False
+
+    def _download_stream(self, url, part_path, offset, timeout, on_data=None):
+        """单连接下载，offset大于0时续传；返回服务器报告的总大小"""
+        headers = {'Range': f'bytes={offset}-'} if offset else {}
+        with self.session.get(url, headers=headers, stream=True, timeout=timeout) as response:
+            if response.status_code == 416:
+                # 已经下载完整
+                match = _CONTENT_RANGE.match(response.headers.get('Content-Range', ''))
+                return int(match.group(3)) if match and match.group(3) != '*' else offset
+            response.raise_for_status()
+
+            if offset and response.status_code == 206:
+                mode = 'ab'
+                match = _CONTENT_RANGE.match(response.headers.get('Content-Range', ''))
+                total = int(match.group(3)) if match and match.group(3) != '*' else None
+            else:
+                # 服务器不支持Range，从头下载
+                mode = 'wb'
+                length = response.headers.get('Content-Length')
+                total = int(length) if length else None
+                if response.headers.get('Content-Encoding', 'identity') != 'identity':
+                    total = None  # Content-Length是压缩后的大小
+
+            with open(part_path, mode) as f:
+                self._copy(response, f, on_data=on_data, position=offset if mode == 'ab' else 0)
+        return total
+
+    def _download_parallel(self, url, part_path, total, timeout):
+        """按字节范围分段并行下载到预分配的文件，每段独立续传"""
+        segments = max(1, self.options['parallel_segments'])
+        segment_size = -(-total // segments)
+        ranges = [(start, min(start + segment_size, total) - 1)
+                  for start in range(0, total, segment_size)]
+
+        with open(part_path, 'wb') as f:
+            f.truncate(total)
+
+        def fetch(byte_range):
+            start, end = byte_range
+            position = start
+            last_error = None
+            failures = 0  # 没有任何进展的连续失败次数
+            while True:
+                attempt_start = position
+                try:
+                    headers = {'Range': f'bytes={position}-{end}'}
+                    with self.session.get(url, headers=headers, stream=True, timeout=timeout) as response:
+                        response.raise_for_status()
+                        if response.status_code != 206:
+                            raise DownloadError("服务器未按Range返回分段")
+                        with open(part_path, 'r+b') as f:
+                            f.seek(position)
+                            try:
+                                self._copy(response, f, end - position + 1)
+                            finally:
+                                # 连接中途断开时已写入的数据同样计入，重试从最后写入的字节续传
+                                position = f.tell()
+                    if position > end:
+                        return
+                    last_error = DownloadError("连接提前关闭")
+                except _RETRYABLE as e:
+                    last_error = e
+
+                failures = 1 if position > attempt_start else failures + 1
+                if failures > self.options['retries']:
+                    raise DownloadError(f"分段 {start}-{end} 下载失败: {last_error}")
+                time.sleep(min(2 ** (failures - 1), 10))
+
+        with ThreadPoolExecutor(max_workers=len(ranges)) as executor:
+            list(executor.map(fetch, ranges))
+
+    def _copy(self, response, f, limit=None, on_data=None, position=0):
+        """按自适应块大小把响应体写入文件，返回写入的字节数
+
+        limit为None时读到结束；否则最多读取limit字节（分段下载）。
+        on_data不为空时，每写入一块以 (文件偏移, 数据) 回调，position为起始偏移。
+        """
+        chunk = self.options['min_chunk']
+        written = 0
+        raw = response.raw
+        while limit is None or written < limit:
+            size = chunk if limit is None else min(chunk, limit - written)
+            start = time.perf_counter()
+            data = raw.read(size, decode_content=True)
+            elapsed = time.perf_counter() - start
+            if not data:
+                break
+            f.write(data)
+            if on_data is not None:
+                on_data(position + written, data)
+            written += len(data)
+
+            # 读满一块且很快时加大块，慢时减小块
+            if len(data) == size and elapsed < _FAST_READ:
+                chunk = min(chunk * 2, self.options['max_chunk'])
+            elif elapsed > _SLOW_READ:
+                chunk = max(chunk // 2, self.options['min_chunk'])
+        return written
+
+    @staticmethod
+    def _offset(part_path):
+        try:
+            return os.path.getsize(part_path)
+        except OSError:
+            return 0
+
+    @staticmethod
+    def _verify_checksum(path, checksum):
+        algorithm, _, expected = checksum.partition(':')
+        digest = hashlib.new(algorithm)
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(block)
+        if digest.hexdigest().lower() != expected.lower():
+            raise DownloadError(f"校验失败: {algorithm} 不匹配")
+
+
+_default_downloader = None
+_default_lock = threading.Lock()
+
+
+def get_downloader(options=None):
+    """进程内共享的下载器；传入options时更新其下载参数"""
+    global _default_downloader
+    with _default_lock:
+        if _default_downloader is None:
+            _default_downloader = Downloader(options)
+        elif options:
+            _default_downloader.options.update(options)
+        return _default_downloader
@@ -2,172 +2,716 @@ import os
 import cv2
 import numpy as np
 from PIL import Image
-from rembg import remove, new_session
 import json
 import math
+import time
+import hashlib
+import itertools
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from .matting_cache import MattingCache
+from .sprite_packer import pack_rects, pack_pages, trim_alpha, assemble_sheet
+from .sprite_encoder import save_sprite_sheet, build_palette, StreamingPNGWriter
+from .progressive_ingest import RemoteVideo, ProgressiveIngest
+from .session_pool import get_session_pool
+from .utils import format_size
+
+# 工作进程内的FrameProcessor实例（每个进程持有独立的rembg会话）
+_worker_processor = None
+
+def _init_worker(config, model_name, threads_per_worker):
+    """进程池初始化：为当前工作进程创建独立的处理器和抠图会话"""
+    global _worker_processor
+    # rembg根据OMP_NUM_THREADS设置onnxruntime线程数，避免多个进程争抢CPU
+    os.environ['OMP_NUM_THREADS'] = str(threads_per_worker)
+    _worker_processor = FrameProcessor(config=config, worker_tag=str(os.getpid()))
+    _worker_processor.set_model(model_name)
+
+def _process_in_worker(video_path, action_name):
+    """在工作进程中处理单个动作的视频"""
+    return _worker_processor.process_video(video_path, action_name)
+
+def resize_premultiplied(frames, scale, chunk_size=8):
+    """按alpha预乘后缩放RGBA帧，避免透明边缘出现黑边/色边
+    
+    整数倍缩小时按块求平均（与INTER_AREA等价），同一批帧一次性向量化处理；
+    非整数倍时逐帧使用cv2.resize。
+    """
+    height, width = frames[0].shape[:2]
+    new_width = max(1, round(width * scale))
+    new_height = max(1, round(height * scale))
+    factor = round(1 / scale)
+    block_mode = abs(1 / scale - factor) < 1e-6 and width % factor == 0 and height % factor == 0
+    
+    resized = []
+    # 分块处理，避免整段视频的float缓冲占用过多内存
+    for start in range(0, len(frames), chunk_size):
+        batch = np.stack(frames[start:start + chunk_size]).astype(np.float32)
+        alpha = batch[..., 3:4] / 255.0
+        batch[..., :3] *= alpha
+        
+        if block_mode:
+            n = batch.shape[0]
+            batch = batch.reshape(n, new_height, factor, new_width, factor, 4).mean(axis=(2, 4))
+        else:
+            batch = np.stack([
+                cv2.resize(frame, (new_width, new_height), interpolation=cv2.INTER_AREA)
+                for frame in batch
+            ])
+        
+        # 反预乘
+        alpha = batch[..., 3:4]
+        batch[..., :3] = np.where(alpha > 0, batch[..., :3] * 255.0 / np.maximum(alpha, 1e-6), 0)
+        resized.extend(np.clip(batch + 0.5, 0, 255).astype(np.uint8))
+    
+    return resized
 
 class FrameProcessor:
-    def __init__(self, config_path="config.json"):
-        with open(config_path, 'r') as f:
-            self.config = json.load(f)
+    def __init__(self, config_path="config.json", config=None, worker_tag=None):
+        if config is None:
+            with open(config_path, 'r') as f:
+                config = json.load(f)
+        self.config = config
+        # 工作进程标识，用于隔离各进程的临时目录
+        self.worker_tag = worker_tag
         # 初始化时不创建会话，等用户选择模型后再创建
         self.rembg_session = None
         self.current_model = None
+        self.matting_engine = None
+        self._matting_cache = None
+        # 后台预加载：加载期间set_model会等待同一把锁，不会重复加载
+        self._model_lock = threading.Lock()
+        self._prewarm_thread = None
+        self._target_model = None
+        # 首帧抠图耗时：从第一个视频到达算起，包括等待模型加载的时间
+        self._first_video_time = None
+        self._model_wait = 0.0
+        self.first_matte_latency = None
+        # 最近一次解码的视频的 (源帧率, 总帧数)，用于计算精灵动画的播放帧率
+        self.source_info = None
+        # 作业日志（--resume 模式下记录已完成的精灵图）
+        self.journal = None
         
     def set_model(self, model_name):
-        """设置并初始化指定的抠图模型"""
-        if self.current_model != model_name:
-            print(f"  加载抠图模型: {model_name}...")
-            self.rembg_session = new_session(model_name)
-            self.current_model = model_name
-            print(f"  ✓ 模型加载完成")
+        """设置并初始化指定的抠图模型（加载完成后返回）"""
+        self._target_model = model_name
+        self._load_model(model_name)
+    
+    def use_model(self, model_name):
+        """指定处理时使用的抠图模型
+        
+        多进程处理时每个工作进程在初始化时各自加载模型，这里只记录模型名，
+        避免在主进程中加载用不到的模型（并在进程池创建前初始化onnxruntime）。
+        """
+        if self._workers() > 1:
+            self._target_model = model_name
+        else:
+            self.set_model(model_name)
+    
+    def prewarm(self, model_name):
+        """在后台线程加载抠图模型，与视频生成等耗时步骤重叠
+        
+        开始抠图前会等待加载完成；后台加载失败时在抠图前重新加载并抛出错误。
+        多进程处理时每个工作进程各自加载模型，这里只记录模型名。
+        """
+        self._target_model = model_name
+        if self.current_model == model_name or self._workers() > 1:
+            return
+        
+        def load():
+            try:
+                self._load_model(model_name)
+            except Exception as e:
+                print(f"  ⚠️  预加载抠图模型失败: {e}")
+        
+        self._prewarm_thread = threading.Thread(target=load, name="prewarm", daemon=True)
+        self._prewarm_thread.start()
+    
+    def _load_model(self, model_name):
+        # rembg会连带导入onnxruntime等依赖，推迟到第一次加载模型时导入
+        from .matting import MattingEngine
+        
+        # 后台预加载期间其他调用在这里等待，不会重复加载
+        with self._model_lock:
+            if self.current_model == model_name:
+                return
+            proc_config = self.config.get('frame_processing', {})
+            pool = get_session_pool(proc_config.get('session_pool'))
             
+            # 会话池中已有该模型时直接复用，切换模型不需要重新加载
+            loaded = pool.is_loaded(model_name)
+            if not loaded:
+                print(f"  加载抠图模型: {model_name}...")
+            start = time.perf_counter()
+            session = pool.acquire(model_name)
+            self.matting_engine = MattingEngine(
+                session,
+                model_name,
+                batch_size=proc_config.get('batch_size', 8),
+                temporal=proc_config.get('temporal_reuse'),
+                refinement=proc_config.get('refinement', 'alpha_matting')
+            )
+            if self.rembg_session is not None:
+                pool.release(self.rembg_session)
+            self.rembg_session = session
+            self.current_model = model_name
+            if loaded:
+                print(f"  ✓ 使用已加载的抠图模型: {model_name}")
+            else:
+                print(f"  ✓ 模型加载完成 ({time.perf_counter() - start:.1f}秒)")
+    
+    def _workers(self):
+        return self.config.get('frame_processing', {}).get('workers', 1)
+    
+    def _ensure_model(self):
+        """等待后台预加载完成，确保当前使用的是选定的抠图模型"""
+        start = time.perf_counter()
+        if self._prewarm_thread is not None:
+            self._prewarm_thread.join()
+            self._prewarm_thread = None
+        if self._target_model and self.current_model != self._target_model:
+            self._load_model(self._target_model)
+        self._model_wait += time.perf_counter() - start
+    
     def extract_frames(self, video_path, action_name):
-        """从视频中提取帧"""
+        """从视频中提取帧（返回RGB格式的NumPy数组，不写临时文件）"""
+        frames = list(self._iter_frames(video_path))
+        
+        # 调试模式下保存原始帧
+        if self._debug_frames_enabled():
+            self._save_debug_frames(frames, action_name)
+            
+        return frames
+    
+    def _iter_frames(self, video_path, seekable=True):
+        """按时间戳采样并逐帧产出RGB数组，跳过的帧只grab不解码输出
+        
+        seekable为False时（从管道读取）只顺序grab，不做定位
+        """
         cap = cv2.VideoCapture(video_path)
-        fps = self.config['video_settings']['fps']
         video_fps = cap.get(cv2.CAP_PROP_FPS)
+        total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        self.source_info = (video_fps, total_frames)
+        seek_threshold = self.config.get('frame_processing', {}).get('seek_threshold', 30)
+        if not seekable:
+            seek_threshold = math.inf
         
-        # 计算帧采样间隔
-        frame_interval = int(video_fps / fps)
+        position = 0  # 下一次读取的帧序号
+        try:
+            for index in self._sample_indices(video_fps, total_frames):
+                gap = index - position
+                if gap > seek_threshold:
+                    # 跨度较大时直接定位
+                    cap.set(cv2.CAP_PROP_POS_FRAMES, index)
+                else:
+                    # 跨度较小时只grab，不做retrieve的颜色转换和拷贝
+                    for _ in range(gap):
+                        if not cap.grab():
+                            return
+                position = index
+                
+                ret, frame = cap.read()
+                if not ret:
+                    return
+                position += 1
+                
+                # OpenCV解码结果为BGR，统一转换为RGB
+                yield cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        finally:
+            cap.release()
+    
+    def _sample_indices(self, video_fps, total_frames):
+        """根据目标帧率或目标帧数计算需要采样的源帧序号（按时间戳取最近帧）"""
+        proc_config = self.config.get('frame_processing', {})
+        frame_count = proc_config.get('frame_count')
+        target_fps = self._target_fps()
         
-        frames = []
-        frame_count = 0
-        saved_count = 0
+        if video_fps <= 0:
+            # 无法获取源帧率时按目标帧率处理
+            video_fps = target_fps
         
-        # 创建临时目录存储原始帧
-        temp_dir = f"./temp_frames/{action_name}"
-        os.makedirs(temp_dir, exist_ok=True)
+        if frame_count and total_frames > 0:
+            # 固定帧数：在整个视频时长内均匀取帧
+            step = total_frames / frame_count
+            candidates = (math.floor(k * step + 0.5) for k in range(frame_count))
+        else:
+            # 固定帧率：第k帧的时间戳为 k / target_fps
+            step = video_fps / target_fps
+            candidates = (math.floor(k * step + 0.5) for k in itertools.count())
         
-        while True:
-            ret, frame = cap.read()
-            if not ret:
+        last_index = -1
+        for index in candidates:
+            if total_frames > 0 and index >= total_frames:
                 break
-                
-            if frame_count % frame_interval == 0:
-                frame_path = os.path.join(temp_dir, f"frame_{saved_count:03d}.png")
-                cv2.imwrite(frame_path, frame)
-                frames.append(frame_path)
-                saved_count += 1
-                
-            frame_count += 1
+            # 目标帧率高于源帧率时会映射到同一帧，跳过重复
+            if index > last_index:
+                yield index
+                last_index = index
+    
+    def _target_fps(self):
+        """采样的目标帧率"""
+        proc_config = self.config.get('frame_processing', {})
+        return proc_config.get('target_fps') or self.config['video_settings']['fps']
+    
+    def _playback_fps(self):
+        """精灵动画的播放帧率，与_sample_indices实际产出的帧数对应
+        
+        目标帧率高于源帧率、或指定帧数多于源帧数时，重复的帧会被跳过，
+        播放帧率按实际取到的帧数和视频时长换算，否则动画会加速播放。
+        """
+        frame_count = self.config.get('frame_processing', {}).get('frame_count')
+        video_fps, total_frames = self.source_info or (0, 0)
+        
+        if frame_count and total_frames > 0:
+            if video_fps > 0:
+                return min(frame_count, total_frames) / (total_frames / video_fps)
+            return frame_count / self.config['video_settings']['duration']
+        if frame_count and video_fps <= 0:
+            return frame_count / self.config['video_settings']['duration']
+        
+        target_fps = self._target_fps()
+        return min(target_fps, video_fps) if video_fps > 0 else target_fps
+    
+    def remove_background(self, frames, action_name=None):
+        """批量移除背景（输入RGB数组，输出RGBA数组）"""
+        # 按batch_size分批推理，使用alpha matting提高质量
+        processed_frames = list(self._iter_remove_background(frames))
+        self._report_matting_stats()
+        
+        # 调试模式下保存抠图结果
+        if action_name and self._debug_frames_enabled():
+            self._save_debug_frames(processed_frames, action_name, suffix='_nobg')
             
-        cap.release()
-        return frames
+        return processed_frames
     
-    def remove_background(self, frame_paths):
-        """批量移除背景"""
-        processed_frames = []
+    def _iter_remove_background(self, frames):
+        """逐帧产出抠图结果（开始前等待模型就绪）"""
+        self._ensure_model()
+        for result in self._matte_frames(frames):
+            if self._first_video_time is not None:
+                self._report_first_matte()
+            yield result
+    
+    def _report_first_matte(self):
+        """报告第一个视频到达后多久产出第一帧抠图结果"""
+        self.first_matte_latency = time.perf_counter() - self._first_video_time
+        print(f"  ⏱  首帧抠图: 视频到达后 {self.first_matte_latency:.1f}秒"
+              f"（其中等待模型 {self._model_wait:.1f}秒）")
+        self._first_video_time = None
+    
+    def _matte_frames(self, frames):
+        """逐帧抠图，启用缓存时只对未命中的帧做抠图"""
+        cache = self._get_matting_cache()
+        
+        if cache is None:
+            yield from self.matting_engine.process(frames)
+            return
         
-        for frame_path in frame_paths:
-            # 读取图片
-            with open(frame_path, 'rb') as f:
-                input_img = f.read()
+        params = self.matting_engine.cache_params()
+        self.matting_engine.reset()
+        temporal = self.matting_engine.temporal['enabled']
+        previous_missed = False  # 上一帧是否送入了抠图引擎
+        hits = 0
+        total = 0
+        
+        # 按批次查缓存，未命中的帧仍以整批送入抠图引擎
+        for chunk in self._chunked(frames, self.matting_engine.batch_size):
+            keys = [cache.key(frame, self.current_model, params) for frame in chunk]
+            cached = [cache.get(key) for key in keys]
             
-            # 移除背景，使用alpha matting提高质量
-            output_img = remove(
-                input_img,
-                session=self.rembg_session,
-                alpha_matting=True,
-                alpha_matting_foreground_threshold=270,
-                alpha_matting_background_threshold=10,
-                alpha_matting_erode_size=10
-            )
+            if temporal:
+                # 增量抠图要求帧前后相邻，命中缓存的帧把未命中的帧分隔成多段，每段重新开始
+                computed = self._matte_runs(chunk, cached, previous_missed)
+            else:
+                misses = [frame for frame, result in zip(chunk, cached) if result is None]
+                computed = iter(self.matting_engine.process(misses, reset=False))
             
-            # 保存处理后的图片（覆盖原图）
-            processed_path = frame_path.replace('.png', '_nobg.png')
-            with open(processed_path, 'wb') as f:
-                f.write(output_img)
-                
-            processed_frames.append(processed_path)
-            
-        return processed_frames
+            for key, result in zip(keys, cached):
+                if result is None:
+                    result = next(computed)
+                    cache.put(key, result)
+                else:
+                    hits += 1
+                total += 1
+                yield result
+            previous_missed = cached[-1] is None
+        
+        print(f"  ✓ 抠图缓存命中 {hits}/{total} 帧")
+    
+    def _matte_runs(self, chunk, cached, continues):
+        """按连续未命中的帧分段抠图；continues表示第一段紧接着上一批的最后一帧"""
+        run = []
+        for frame, result in zip(chunk, cached):
+            if result is None:
+                run.append(frame)
+                continue
+            if run:
+                yield from self._matte_run(run, continues)
+                run = []
+            continues = False
+        if run:
+            yield from self._matte_run(run, continues)
+    
+    def _matte_run(self, run, continues):
+        if not continues:
+            self.matting_engine.reset_reference()
+        yield from self.matting_engine.process(run, reset=False)
+    
+    def _chunked(self, items, size):
+        """把可迭代对象按固定大小分组"""
+        iterator = iter(items)
+        while True:
+            chunk = list(itertools.islice(iterator, size))
+            if not chunk:
+                return
+            yield chunk
     
-    def create_sprite_sequence(self, frame_paths, action_name):
+    def _report_matting_stats(self):
+        """增量抠图模式下报告跳过的推理次数"""
+        stats = self.matting_engine.stats
+        if stats['reused'] or stats['region']:
+            print(f"  ✓ 整帧推理 {stats['inferred']} 帧，局部推理 {stats['region']} 帧，"
+                  f"跳过推理 {stats['reused']} 帧")
+    
+    def _get_matting_cache(self):
+        """按配置创建抠图缓存（未启用时返回None）"""
+        cache_config = self.config.get('matting_cache', {})
+        if not cache_config.get('enabled', False):
+            return None
+        if self._matting_cache is None:
+            self._matting_cache = MattingCache(
+                cache_config.get('path', './cache/matting'),
+                cache_config.get('max_size_mb', 2048)
+            )
+        return self._matting_cache
+    
+    def create_sprite_sequence(self, frames, action_name):
         """将处理后的帧生成精灵表"""
         output_dir = os.path.join(self.config['output_paths']['sprites'], action_name)
         os.makedirs(output_dir, exist_ok=True)
+        sheet_config = self.config.get('sprite_sheet', {})
+        
+        # 去除重复帧，动画序列通过frame_sequence映射到精灵图中的格子
+        frame_sequence = None
+        dedup_config = sheet_config.get('dedup', {})
+        if dedup_config.get('enabled', False):
+            unique_indices, frame_sequence = self._deduplicate_frames(
+                frames, dedup_config.get('tolerance', 0)
+            )
+            if len(unique_indices) < len(frames):
+                print(f"  ✓ 去除重复帧: {len(frames)} → {len(unique_indices)} 帧")
+            frames = [frames[i] for i in unique_indices]
         
-        images = []
+        if not frames:
+            return None
+        
+        # 调色板模式下，同一动作的所有帧（含各倍率）共用一个调色板
+        palette = None
+        if sheet_config.get('encoder', 'png') == 'png_palette':
+            colors = sheet_config.get('encoder_options', {}).get('palette_colors', 256)
+            palette = build_palette(frames, colors)
         
-        for frame_path in frame_paths:
-            # 读取图片
-            img = Image.open(frame_path)
+        # 同一批抠图结果生成多个分辨率的精灵图，按倍率从大到小排列
+        scales = sorted(sheet_config.get('scales', [1.0]), reverse=True)
+        sheets = []
+        sprite_path = None
+        
+        for scale in scales:
+            scaled_frames = frames if scale == 1 else resize_premultiplied(frames, scale)
             
             # 确保是RGBA格式（带透明通道）
-            if img.mode != 'RGBA':
-                img = img.convert('RGBA')
+            images = [frame if frame.shape[-1] == 4 else cv2.cvtColor(frame, cv2.COLOR_RGB2RGBA)
+                      for frame in scaled_frames]
             
-            images.append(img)
+            # 生成精灵图
+            path, sheet = self._create_sprite_sheet(images, action_name, self._sheet_suffix(scale), palette)
+            sheet = {"scale": scale, "image": os.path.basename(path), **sheet}
+            sheets.append(sheet)
+            sprite_path = sprite_path or path
+            print(f"  ✓ Sprite Sheet: {path}")
         
-        # 生成精灵图
-        sprite_path = self._create_sprite_sheet(images, action_name)
-        print(f"  ✓ Sprite Sheet: {sprite_path}")
-            
-        # 清理临时文件
-        self._cleanup_temp_files(action_name)
+        # 生成配置文件
+        self._create_sprite_config(action_name, len(frames), sheets, frame_sequence)
         
         return sprite_path
     
-    def _create_sprite_sheet(self, images, action_name):
-        """创建sprite sheet（精灵图）"""
-        if not images:
-            return None
+    def _sheet_suffix(self, scale):
+        """不同倍率的精灵图文件名后缀，1x不加后缀"""
+        if scale == 1:
+            return ""
+        return f"@{scale:g}x"
+    
+    def _deduplicate_frames(self, frames, tolerance=0):
+        """找出不重复的帧
+        
+        先按RGBA内容哈希精确去重；tolerance大于0时，再用降采样后的平均像素差
+        (0-255) 判断近似重复。
+        
+        Returns:
+            (unique_indices, frame_sequence)：保留帧在原序列中的下标，
+            以及每个动画帧对应的精灵图格子序号
+        """
+        unique_indices = []
+        frame_sequence = []
+        hash_to_cell = {}
+        signatures = []
+        
+        for idx, frame in enumerate(frames):
+            digest = hashlib.blake2b(np.ascontiguousarray(frame).data, digest_size=16).digest()
+            cell = hash_to_cell.get(digest)
             
+            if cell is None and tolerance > 0:
+                signature = frame[::4, ::4].astype(np.float32)
+                if signatures and signatures[0].shape == signature.shape:
+                    diffs = np.abs(np.stack(signatures) - signature).mean(axis=(1, 2, 3))
+                    best = int(np.argmin(diffs))
+                    if diffs[best] <= tolerance:
+                        cell = best
+            
+            if cell is None:
+                cell = len(unique_indices)
+                unique_indices.append(idx)
+                if tolerance > 0:
+                    signatures.append(frame[::4, ::4].astype(np.float32))
+            
+            hash_to_cell.setdefault(digest, cell)
+            frame_sequence.append(cell)
+        
+        return unique_indices, frame_sequence
+    
+    def _create_sprite_sheet(self, images, action_name, suffix="", palette=None):
+        """创建sprite sheet（精灵图），返回 (文件路径, 布局信息)
+        
+        images为RGBA帧数组，按切片拷入预先分配的精灵图数组
+        """
         # 获取配置
         config = self.config.get('sprite_sheet', {})
+        if config.get('max_height'):
+            return self._create_paged_sheet(images, action_name, suffix, palette)
+        if config.get('layout', 'grid') == 'atlas':
+            return self._create_atlas_sheet(images, action_name, suffix, palette)
+        
         max_width = config.get('max_width', 2048)
         padding = config.get('padding', 2)
         bg_color = tuple(config.get('background_color', [0, 0, 0, 0]))
         
         # 获取单帧尺寸（假设所有帧大小相同）
-        frame_width, frame_height = images[0].size
+        frame_height, frame_width = images[0].shape[:2]
         
         # 计算布局
-        frames_per_row = min(len(images), max_width // (frame_width + padding))
+        frames_per_row = max(1, min(len(images), max_width // (frame_width + padding)))
         rows_needed = math.ceil(len(images) / frames_per_row)
         
         # 计算sprite sheet尺寸
         sheet_width = frames_per_row * (frame_width + padding) - padding
         sheet_height = rows_needed * (frame_height + padding) - padding
         
-        # 创建sprite sheet
-        sprite_sheet = Image.new('RGBA', (sheet_width, sheet_height), bg_color)
-        
-        # 将每一帧粘贴到sprite sheet上
+        # 将每一帧拷贝到sprite sheet上
+        placements = []
         for idx, img in enumerate(images):
             row = idx // frames_per_row
             col = idx % frames_per_row
-            x = col * (frame_width + padding)
-            y = row * (frame_height + padding)
-            sprite_sheet.paste(img, (x, y))
+            placements.append((img, col * (frame_width + padding), row * (frame_height + padding)))
+        sprite_sheet, opaque = assemble_sheet(sheet_width, sheet_height, placements, bg_color)
         
         # 保存sprite sheet
-        output_dir = os.path.join(self.config['output_paths']['sprites'], action_name)
-        sprite_path = os.path.join(output_dir, f"{action_name}_sprite_sheet.png")
-        sprite_sheet.save(sprite_path, 'PNG', optimize=True)
+        saved = self._save_sprite_sheet(sprite_sheet, action_name, suffix, palette)
         
-        # 生成配置文件
-        self._create_sprite_config(action_name, len(images), frame_width, 
-                                  frame_height, frames_per_row, rows_needed)
+        # 显示sprite sheet信息
+        self._report_sheet(action_name, len(images), (frame_width, frame_height),
+                           (sheet_width, sheet_height), saved, opaque)
+        
+        return saved[0], {
+            "frame_width": frame_width,
+            "frame_height": frame_height,
+            "frames_per_row": frames_per_row,
+            "rows": rows_needed
+        }
+    
+    def _create_atlas_sheet(self, images, action_name, suffix="", palette=None):
+        """创建紧凑图集：每帧裁剪到alpha包围盒后用MaxRects装箱"""
+        config = self.config.get('sprite_sheet', {})
+        max_width = config.get('max_width', 2048)
+        padding = config.get('padding', 2)
+        bg_color = tuple(config.get('background_color', [0, 0, 0, 0]))
+        
+        frame_height, frame_width = images[0].shape[:2]
+        
+        crops, offsets = self._trim_frames(images)
+        
+        # 装箱
+        positions, sheet_width, sheet_height = pack_rects(
+            [(crop.shape[1], crop.shape[0]) for crop in crops], max_width, padding
+        )
+        
+        frames = self._frame_records(crops, [(None, x, y) for x, y in positions], offsets)
+        sprite_sheet, opaque = assemble_sheet(
+            sheet_width, sheet_height,
+            [(crop, x, y) for crop, (x, y) in zip(crops, positions)], bg_color
+        )
+        
+        # 保存sprite sheet
+        saved = self._save_sprite_sheet(sprite_sheet, action_name, suffix, palette)
         
         # 显示sprite sheet信息
-        self._show_sprite_info(action_name, images, sprite_path)
+        self._report_sheet(action_name, len(images), (frame_width, frame_height),
+                           (sheet_width, sheet_height), saved, opaque)
         
-        return sprite_path
+        # frame_width/frame_height为原始帧尺寸，用于还原位置
+        return saved[0], {
+            "frame_width": frame_width,
+            "frame_height": frame_height,
+            "layout": "atlas",
+            "frames": frames
+        }
+    
+    def _create_paged_sheet(self, images, action_name, suffix="", palette=None):
+        """按纹理尺寸上限把帧分配到多页，每页不超过 max_width x max_height
+        
+        网格布局按行列分页；图集布局先裁剪透明边缘再用MaxRects逐页装箱。
+        各页并发编码，配置文件的frames记录每帧所在的页和矩形。
+        """
+        config = self.config.get('sprite_sheet', {})
+        layout = config.get('layout', 'grid')
+        max_width = config.get('max_width', 2048)
+        max_height = config['max_height']
+        padding = config.get('padding', 2)
+        bg_color = tuple(config.get('background_color', [0, 0, 0, 0]))
+        
+        frame_height, frame_width = images[0].shape[:2]
+        
+        if layout == 'atlas':
+            crops, offsets = self._trim_frames(images)
+            positions, page_sizes = pack_pages(
+                [(crop.shape[1], crop.shape[0]) for crop in crops], max_width, max_height, padding
+            )
+        else:
+            if frame_width > max_width or frame_height > max_height:
+                raise ValueError(f"帧尺寸 {frame_width}x{frame_height} 超出单页上限 {max_width}x{max_height}")
+            crops = images
+            offsets = [(0, 0)] * len(images)
+            frames_per_row = max(1, min(len(images), (max_width + padding) // (frame_width + padding)))
+            rows_per_page = max(1, (max_height + padding) // (frame_height + padding))
+            frames_per_page = frames_per_row * rows_per_page
+            
+            positions = []
+            for idx in range(len(images)):
+                page, cell = divmod(idx, frames_per_page)
+                row, col = divmod(cell, frames_per_row)
+                positions.append((page, col * (frame_width + padding), row * (frame_height + padding)))
+            
+            page_sizes = []
+            for page in range(math.ceil(len(images) / frames_per_page)):
+                count = min(frames_per_page, len(images) - page * frames_per_page)
+                cols = min(count, frames_per_row)
+                rows = math.ceil(count / frames_per_row)
+                page_sizes.append((cols * (frame_width + padding) - padding,
+                                   rows * (frame_height + padding) - padding))
+        
+        # 拼接各页
+        placements = [[] for _ in page_sizes]
+        for crop, (page, x, y) in zip(crops, positions):
+            placements[page].append((crop, x, y))
+        frames = self._frame_records(crops, positions, offsets)
+        assembled = [assemble_sheet(width, height, page_placements, bg_color)
+                     for (width, height), page_placements in zip(page_sizes, placements)]
+        sheets = [sheet for sheet, _ in assembled]
+        
+        # 各页并发编码（Pillow和zlib编码时会释放GIL）
+        workers = min(len(sheets), os.cpu_count() or 1)
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            saved = list(executor.map(
+                lambda item: self._save_sprite_sheet(item[1], action_name, f"{suffix}_p{item[0]}", palette),
+                enumerate(sheets)
+            ))
+        
+        # 显示每页信息
+        for page, page_saved in enumerate(saved):
+            self._report_sheet(f"{action_name} 第{page + 1}/{len(saved)}页", len(placements[page]),
+                               (frame_width, frame_height), page_sizes[page], page_saved, assembled[page][1])
+        
+        return saved[0][0], {
+            "frame_width": frame_width,
+            "frame_height": frame_height,
+            "layout": layout,
+            "pages": [os.path.basename(path) for path, _, _ in saved],
+            "frames": frames
+        }
+    
+    def _trim_frames(self, images):
+        """裁剪掉透明边缘，返回裁剪后的帧和裁剪区域在原帧中的偏移"""
+        crops = []
+        offsets = []
+        for img in images:
+            crop, offset_x, offset_y = trim_alpha(img)
+            crops.append(crop)
+            offsets.append((offset_x, offset_y))
+        return crops, offsets
+    
+    def _frame_records(self, crops, positions, offsets):
+        """配置文件中每帧的矩形记录；positions为 (页序号, x, y)，单页布局的页序号为None"""
+        frames = []
+        for crop, (page, x, y), (offset_x, offset_y) in zip(crops, positions, offsets):
+            record = {} if page is None else {"page": page}
+            record.update({
+                "x": x,
+                "y": y,
+                "w": crop.shape[1],
+                "h": crop.shape[0],
+                "offset_x": offset_x,
+                "offset_y": offset_y
+            })
+            frames.append(record)
+        return frames
+    
+    def _report_sheet(self, label, frame_count, frame_size, sheet_size, saved, opaque):
+        """显示一张精灵图的信息；saved为_save_sprite_sheet的返回值"""
+        _, file_size, encode_time = saved
+        self._show_sprite_info(label, {
+            "frame_count": frame_count,
+            "frame_size": frame_size,
+            "sheet_size": sheet_size,
+            "file_size": file_size,
+            "encode_time": encode_time,
+            "opaque_pixels": opaque
+        })
     
-    def _create_sprite_config(self, action_name, frame_count, frame_width, 
-                             frame_height, frames_per_row, rows):
-        """创建sprite sheet的配置文件（方便游戏引擎使用）"""
+    def _save_sprite_sheet(self, sprite_sheet, action_name, suffix="", palette=None):
+        """按配置的编码器保存精灵图，返回 (文件路径, 文件字节数, 编码耗时)"""
+        config = self.config.get('sprite_sheet', {})
+        output_dir = os.path.join(self.config['output_paths']['sprites'], action_name)
+        base_path = os.path.join(output_dir, f"{action_name}_sprite_sheet{suffix}")
+        
+        start = time.perf_counter()
+        sprite_path, file_size = save_sprite_sheet(
+            sprite_sheet,
+            base_path,
+            config.get('encoder', 'png'),
+            config.get('encoder_options'),
+            palette
+        )
+        return sprite_path, file_size, time.perf_counter() - start
+    
+    def _create_sprite_config(self, action_name, frame_count, sheets, frame_sequence=None):
+        """创建sprite sheet的配置文件（方便游戏引擎使用）
+        
+        顶层字段描述最大倍率的精灵图；生成多个倍率时，variants中列出每个倍率各自的布局
+        """
+        base = sheets[0]
         config = {
             "name": action_name,
             "frame_count": frame_count,
-            "frame_width": frame_width,
-            "frame_height": frame_height,
-            "frames_per_row": frames_per_row,
-            "rows": rows,
-            "fps": self.config['video_settings']['fps']
+            "frame_width": base["frame_width"],
+            "frame_height": base["frame_height"]
         }
+        config.update({key: value for key, value in base.items() if key not in config})
+        config["fps"] = self._playback_fps()
+        
+        if frame_sequence is not None:
+            config["frame_sequence"] = frame_sequence
+        if len(sheets) > 1:
+            config["variants"] = sheets
         
         output_dir = os.path.join(self.config['output_paths']['sprites'], action_name)
         config_path = os.path.join(output_dir, f"{action_name}_sprite_config.json")
@@ -175,41 +719,48 @@ class FrameProcessor:
         with open(config_path, 'w') as f:
             json.dump(config, f, indent=2)
     
-    def _show_sprite_info(self, action_name, images, sprite_sheet_path):
-        """显示sprite sheet信息"""
-        # sprite sheet大小
-        sprite_sheet_size = os.path.getsize(sprite_sheet_path)
+    def _show_sprite_info(self, action_name, info):
+        """显示sprite sheet信息
         
-        # 获取sprite sheet图片信息
-        sprite_img = Image.open(sprite_sheet_path)
-        width, height = sprite_img.size
+        所有数值都在拼接和编码时记录，不需要重新读取或解码输出文件
+        """
+        width, height = info["sheet_size"]
+        frame_width, frame_height = info["frame_size"]
         
         print(f"\n  📊 Sprite Sheet 信息 ({action_name}):")
-        print(f"     文件大小: {self._format_size(sprite_sheet_size)}")
+        print(f"     文件大小: {format_size(info['file_size'])}")
+        if info.get("encode_time") is not None:
+            encoder = self.config.get('sprite_sheet', {}).get('encoder', 'png')
+            print(f"     编码: {encoder} ({info['encode_time']:.2f}秒)")
         print(f"     尺寸: {width} x {height} px")
-        print(f"     总帧数: {len(images)}")
-        print(f"     单帧尺寸: {images[0].size[0]} x {images[0].size[1]} px")
-    
-    def _format_size(self, size_bytes):
-        """格式化文件大小"""
-        for unit in ['B', 'KB', 'MB', 'GB']:
-            if size_bytes < 1024.0:
-                return f"{size_bytes:.1f} {unit}"
-            size_bytes /= 1024.0
-        return f"{size_bytes:.1f} TB"
+        print(f"     纹理内存: {format_size(width * height * 4)}")
+        if info.get("opaque_pixels") is not None:
+            print(f"     填充率: {info['opaque_pixels'] / max(1, width * height):.1%}")
+        print(f"     总帧数: {info['frame_count']}")
+        print(f"     单帧尺寸: {frame_width} x {frame_height} px")
     
     def process_video(self, video_path, action_name):
         """完整的视频处理流程"""
         print(f"正在处理 {action_name} 视频...")
         
+        # 清理上一次运行遗留的调试帧
+        if self._debug_frames_enabled():
+            self._cleanup_temp_files(action_name)
+        
+        if isinstance(video_path, RemoteVideo):
+            return self._process_remote_video(video_path, action_name)
+        
+        if self._streaming_sheet_enabled():
+            return self._process_video_streaming(video_path, action_name)
+        
         # 1. 提取帧
         print(f"  提取帧...")
-        frame_paths = self.extract_frames(video_path, action_name)
-        print(f"  ✓ 提取了 {len(frame_paths)} 帧")
+        frames = self.extract_frames(video_path, action_name)
+        print(f"  ✓ 提取了 {len(frames)} 帧")
         
         # 2. 移除背景
         print(f"  移除背景...")
-        processed_frames = self.remove_background(frame_paths)
+        processed_frames = self.remove_background(frames, action_name)
         print(f"  ✓ 背景移除完成")
         
         # 3. 创建精灵表
@@ -218,9 +769,291 @@ class FrameProcessor:
         
         return sprite_path
     
+    def _streaming_sheet_enabled(self):
+        """流式写入精灵图只支持单倍率、不去重的网格布局PNG"""
+        config = self.config.get('sprite_sheet', {})
+        if not config.get('streaming', False):
+            return False
+        
+        supported = (
+            config.get('layout', 'grid') == 'grid'
+            and config.get('encoder', 'png') in ('png', 'png_parallel')
+            and list(config.get('scales', [1.0])) == [1.0]
+            and not config.get('dedup', {}).get('enabled', False)
+            and not config.get('max_height')
+            and not self._debug_frames_enabled()
+        )
+        if not supported:
+            print("  ⚠️  当前精灵图设置不支持流式写入，使用常规方式生成")
+        return supported
+    
+    def _process_remote_video(self, video, action_name):
+        """边下载边解码：采样帧直接送入抠图，下载、解码与抠图重叠进行
+        
+        容器需要完整文件（moov位于末尾）、使用固定帧数采样（需要总帧数）或调试模式下，
+        等待下载完成后按普通文件处理；管道中解码出的帧数少于完整文件应采样的帧数或数据不连续时，
+        同样在下载完成后按完整文件重新处理。下载失败时返回None。
+        """
+        proc_config = self.config.get('frame_processing', {})
+        decoded = 0
+        
+        def count(frames):
+            nonlocal decoded
+            for frame in frames:
+                decoded += 1
+                yield frame
+        
+        # 固定帧数采样需要总帧数，调试模式需要保存原始帧，这两种情况只下载不建管道
+        stream = not (proc_config.get('frame_count') or self._debug_frames_enabled())
+        with ProgressiveIngest(video.url, video.path) as ingest:
+            source = ingest.start(stream=stream)
+            
+            sprite_path = None
+            if source is None:
+                print(f"  等待 {action_name} 视频下载完成...")
+            else:
+                print(f"  边下载边解码、移除背景...")
+                frames = count(self._iter_frames(source, seekable=False))
+                processed_frames = self._iter_remove_background(frames)
+                
+                if self._streaming_sheet_enabled():
+                    output_dir = os.path.join(self.config['output_paths']['sprites'], action_name)
+                    os.makedirs(output_dir, exist_ok=True)
+                    sprite_path = self._create_streaming_sheet(processed_frames, action_name)
+                    self._report_matting_stats()
+                    if sprite_path:
+                        print(f"  ✓ Sprite Sheet: {sprite_path}")
+                else:
+                    processed_frames = list(processed_frames)
+                    self._report_matting_stats()
+                    if processed_frames:
+                        print(f"  ✓ 背景移除完成 ({len(processed_frames)} 帧)")
+                        print(f"  生成精灵表...")
+                        sprite_path = self.create_sprite_sequence(processed_frames, action_name)
+            
+            try:
+                ingest.wait()
+            except Exception as e:
+                print(f"  ✗ {action_name} 视频下载失败: {e}")
+                return None
+            self._record_download(action_name, video.path)
+        
+        if source is None:
+            return self.process_video(video.path, action_name)
+        if ingest.stream_broken:
+            # 管道中的数据不连续，按完整文件重新处理（抠图结果可从缓存复用）
+            print(f"  ⚠️  {action_name} 下载数据不连续，按完整文件重新处理")
+            return self.process_video(video.path, action_name)
+        expected = self._expected_samples(video.path)
+        if decoded == 0 or (expected is not None and decoded < expected):
+            # 例如音视频未交错存放、顺序读取时需要跳转，管道中无法（完整）解码
+            print(f"  ⚠️  {action_name} 边下载边解码只取到 {decoded}"
+                  f"{f'/{expected}' if expected is not None else ''} 帧，按完整文件重新处理")
+            return self.process_video(video.path, action_name)
+        
+        return sprite_path
+    
+    def _expected_samples(self, video_path):
+        """按完整文件应采样的帧数，无法获取总帧数时返回None"""
+        cap = cv2.VideoCapture(video_path)
+        video_fps = cap.get(cv2.CAP_PROP_FPS)
+        total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        cap.release()
+        if total_frames <= 0:
+            return None
+        return sum(1 for _ in self._sample_indices(video_fps, total_frames))
+    
+    def _record_download(self, action_name, video_path):
+        """边下载边处理时，视频由这里下载完成，记录到作业日志"""
+        if self.journal is not None:
+            self.journal.record('video_downloaded', action=action_name, path=video_path)
+    
+    def _process_video_streaming(self, video_path, action_name):
+        """边提取、边抠图、边写入精灵图，内存中最多保留一行帧"""
+        output_dir = os.path.join(self.config['output_paths']['sprites'], action_name)
+        os.makedirs(output_dir, exist_ok=True)
+        
+        print(f"  提取帧、移除背景并流式生成精灵表...")
+        frames = self._iter_frames(video_path)
+        processed_frames = self._iter_remove_background(frames)
+        sprite_path = self._create_streaming_sheet(processed_frames, action_name)
+        self._report_matting_stats()
+        
+        if sprite_path:
+            print(f"  ✓ Sprite Sheet: {sprite_path}")
+        return sprite_path
+    
+    def _create_streaming_sheet(self, frames, action_name):
+        """按行条带流式写入网格布局的精灵图（与_create_sprite_sheet的像素布局一致）"""
+        config = self.config.get('sprite_sheet', {})
+        max_width = config.get('max_width', 2048)
+        padding = config.get('padding', 2)
+        bg_color = np.array(config.get('background_color', [0, 0, 0, 0]), dtype=np.uint8)
+        level = config.get('encoder_options', {}).get('png_level', 6)
+        
+        frames = iter(frames)
+        first_row = list(itertools.islice(frames, 1))
+        if not first_row:
+            return None
+        
+        frame_height, frame_width = first_row[0].shape[:2]
+        capacity = max(1, max_width // (frame_width + padding))
+        
+        # 先缓存第一行：帧数不足一行时，精灵图宽度按实际帧数计算
+        first_row.extend(itertools.islice(frames, capacity - 1))
+        frames_per_row = len(first_row)
+        sheet_width = frames_per_row * (frame_width + padding) - padding
+        
+        output_dir = os.path.join(self.config['output_paths']['sprites'], action_name)
+        sprite_path = os.path.join(output_dir, f"{action_name}_sprite_sheet.png")
+        
+        # 帧由上游生成器边抠图边产出，编码耗时只统计写入部分
+        encode_time = 0.0
+        frame_count = 0
+        opaque = 0
+        rows = 0
+        strip = np.empty((frame_height, sheet_width, 4), dtype=np.uint8)
+        padding_rows = np.empty((padding, sheet_width, 4), dtype=np.uint8)
+        padding_rows[:] = bg_color
+        
+        with StreamingPNGWriter(sprite_path, sheet_width, level=level) as writer:
+            row_frames = first_row
+            while row_frames:
+                start = time.perf_counter()
+                
+                # 行与行之间的间距
+                if rows > 0 and padding > 0:
+                    writer.write_rows(padding_rows)
+                
+                strip[:] = bg_color
+                for col, frame in enumerate(row_frames):
+                    x = col * (frame_width + padding)
+                    strip[:, x:x + frame_width] = frame
+                    opaque += int(np.count_nonzero(frame[..., 3]))
+                writer.write_rows(strip)
+                encode_time += time.perf_counter() - start
+                
+                frame_count += len(row_frames)
+                rows += 1
+                row_frames = list(itertools.islice(frames, frames_per_row))
+        
+        self._create_sprite_config(action_name, frame_count, [{
+            "scale": 1.0,
+            "image": os.path.basename(sprite_path),
+            "frame_width": frame_width,
+            "frame_height": frame_height,
+            "frames_per_row": frames_per_row,
+            "rows": rows
+        }])
+        self._show_sprite_info(action_name, {
+            "frame_count": frame_count,
+            "frame_size": (frame_width, frame_height),
+            "sheet_size": (sheet_width, writer.height),
+            "file_size": writer.bytes_written,
+            "encode_time": encode_time,
+            "opaque_pixels": opaque
+        })
+        
+        return sprite_path
+    
+    def process_videos(self, video_items):
+        """处理多个动作的视频，返回 {动作: 精灵图路径}
+        
+        video_items 可以是逐个产出 (动作, 视频路径) 的生成器，
+        每个视频到达后立即开始处理，不必等待全部视频生成完成
+        """
+        workers = self._workers()
+        
+        if workers <= 1:
+            results = {}
+            for action, video_path in self._valid_videos(video_items):
+                # 单个动作失败不影响其余动作（与多进程模式一致）
+                try:
+                    results[action] = self.process_video(video_path, action)
+                except Exception as e:
+                    print(f"  ✗ 处理{action}视频失败: {e}")
+                    results[action] = None
+                self._report_result(action, results[action])
+            return results
+        
+        return self._process_videos_parallel(video_items, workers)
+    
+    def _valid_videos(self, video_items):
+        """过滤掉生成失败或不存在的视频，并记录第一个视频到达的时间"""
+        first = True
+        for action, video_path in video_items:
+            if isinstance(video_path, RemoteVideo) or (video_path and os.path.exists(video_path)):
+                if first:
+                    self._first_video_time = time.perf_counter()
+                    self._model_wait = 0.0
+                    first = False
+                yield action, video_path
+    
+    def _report_result(self, action, sprite_path):
+        """单个动作处理完成后立即输出结果"""
+        if sprite_path:
+            if self.journal is not None:
+                self.journal.record('sprites_built', action=action, path=sprite_path)
+            print(f"  ✅ {action} 处理完成: {sprite_path}")
+        else:
+            print(f"  ✗ {action} 处理失败")
+    
+    def _process_videos_parallel(self, video_items, workers):
+        """使用进程池按动作并行处理，每个工作进程持有独立的rembg会话"""
+        threads_per_worker = max(1, (os.cpu_count() or 1) // workers)
+        print(f"  使用 {workers} 个进程并行处理...")
+        
+        results = {}
+        
+        def on_done(future, action, video_path):
+            try:
+                results[action] = future.result()
+            except Exception as e:
+                print(f"  ✗ 处理{action}视频失败: {e}")
+                results[action] = None
+            # 边下载边处理时视频在工作进程中下载，由主进程记录到作业日志
+            if isinstance(video_path, RemoteVideo) and os.path.exists(video_path.path):
+                self._record_download(action, video_path.path)
+            self._report_result(action, results[action])
+        
+        # 流式模式下视频生成线程仍在运行，fork可能复制其他线程持有的锁（如stdout）导致子进程死锁，
+        # 因此用spawn启动工作进程
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=_init_worker,
+            initargs=(self.config, self._target_model, threads_per_worker)
+        ) as executor:
+            # 视频到达即提交；退出with时会等待所有任务及其回调完成
+            for action, video_path in self._valid_videos(video_items):
+                future = executor.submit(_process_in_worker, video_path, action)
+                future.add_done_callback(lambda f, a=action, v=video_path: on_done(f, a, v))
+                    
+        return results
+    
+    def _debug_frames_enabled(self):
+        """是否将中间帧写入临时目录（仅用于调试）"""
+        return self.config.get('frame_processing', {}).get('debug_frames', False)
+    
+    def _temp_dir(self, action_name):
+        """调试帧的临时目录"""
+        temp_root = self.config.get('frame_processing', {}).get('temp_dir', './temp_frames')
+        if self.worker_tag:
+            return os.path.join(temp_root, f"{action_name}_{self.worker_tag}")
+        return os.path.join(temp_root, action_name)
+    
+    def _save_debug_frames(self, frames, action_name, suffix=''):
+        """将帧保存为PNG以便排查问题"""
+        temp_dir = self._temp_dir(action_name)
+        os.makedirs(temp_dir, exist_ok=True)
+        
+        for idx, frame in enumerate(frames):
+            frame_path = os.path.join(temp_dir, f"frame_{idx:03d}{suffix}.png")
+            Image.fromarray(frame).save(frame_path)
+    
     def _cleanup_temp_files(self, action_name):
         """清理临时文件"""
         import shutil
-        temp_dir = f"./temp_frames/{action_name}"
+        temp_dir = self._temp_dir(action_name)
         if os.path.exists(temp_dir):
             shutil.rmtree(temp_dir)
\ No newline at end of file
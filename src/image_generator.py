@@ -1,7 +1,11 @@
 import json
 import base64
+import hashlib
+import io
 import os
+from PIL import Image
 from openai import OpenAI
+from .utils import format_size
 
 class ImageGenerator:
     def __init__(self, config_path="config.json"):
@@ -59,13 +63,98 @@ class ImageGenerator:
         return image_paths
     
     def get_image_base64(self, image_path):
-        """将图片转换为base64格式，供视频生成使用"""
+        """将图片转换为base64格式，供视频生成使用
+        
+        按视频的分辨率和宽高比缩小、重新编码后再转为data URL；
+        结果按图片内容哈希缓存，同一张图片只处理一次
+        """
         with open(image_path, "rb") as f:
             image_bytes = f.read()
-        base64_str = base64.b64encode(image_bytes).decode('utf-8')
         
         # 根据文件扩展名确定MIME类型
         ext = os.path.splitext(image_path)[1].lower()
         mime_type = 'jpeg' if ext in ['.jpg', '.jpeg'] else 'png'
+        original_url = self._data_url(image_bytes, mime_type)
+        
+        ref_config = self.config.get('reference_image', {})
+        if not ref_config.get('enabled', True):
+            return original_url
+        
+        target_size = self._target_size()
+        key = (
+            hashlib.sha256(image_bytes).hexdigest(),
+            target_size,
+            json.dumps(ref_config, sort_keys=True)
+        )
+        cached = _payload_cache.get(key)
+        if cached is not None:
+            return cached
+        
+        payload, payload_mime = self._prepare_reference(image_bytes, target_size, ref_config)
+        data_url = self._data_url(payload, payload_mime)
+        
+        # 重新编码反而更大时使用原图
+        if len(data_url) >= len(original_url):
+            data_url = original_url
+        
+        saved = len(original_url) - len(data_url)
+        print(f"  参考图: {format_size(len(original_url))} → {format_size(len(data_url))}"
+              f"（每个视频任务节省 {format_size(saved)}）")
+        
+        _payload_cache[key] = data_url
+        return data_url
+    
+    def _target_size(self):
+        """视频画面的 (宽, 高)，宽高比未知时为以短边为边长的正方形"""
+        video_config = self.config['video_settings']
+        resolution = video_config.get('resolution', '720p')
+        short_side = int(resolution.rstrip('p')) if resolution.rstrip('p').isdigit() else 720
+        
+        try:
+            ratio_w, ratio_h = (float(x) for x in video_config.get('ratio', '16:9').split(':'))
+        except ValueError:
+            return short_side, short_side
         
-        return f"data:image/{mime_type};base64,{base64_str}"
\ No newline at end of file
+        if ratio_w >= ratio_h:
+            return round(short_side * ratio_w / ratio_h), short_side
+        return short_side, round(short_side * ratio_h / ratio_w)
+    
+    def _prepare_reference(self, image_bytes, target_size, ref_config):
+        """缩小到刚好覆盖视频画面的尺寸并重新编码，返回 (字节, MIME子类型)"""
+        image = Image.open(io.BytesIO(image_bytes))
+        image.load()
+        
+        # 保证缩放后仍能覆盖整个画面（视频生成时会按画面比例裁剪），只缩小不放大
+        scale = max(target_size[0] / image.width, target_size[1] / image.height)
+        if scale < 1:
+            size = (max(1, round(image.width * scale)), max(1, round(image.height * scale)))
+            image = image.resize(size, Image.LANCZOS)
+        
+        # 有透明像素时保留PNG，否则使用JPEG
+        has_alpha = image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info)
+        if has_alpha:
+            alpha = image.convert('RGBA').getchannel('A')
+            has_alpha = alpha.getextrema()[0] < 255
+        
+        output_format = ref_config.get('format', 'auto')
+        if output_format == 'auto':
+            output_format = 'png' if has_alpha else 'jpeg'
+        elif output_format not in ('jpeg', 'png'):
+            raise ValueError(f"不支持的参考图格式: {output_format}（可选 auto / jpeg / png）")
+        
+        buffer = io.BytesIO()
+        if output_format == 'jpeg':
+            image.convert('RGB').save(buffer, 'JPEG', quality=ref_config.get('quality', 90),
+                                      optimize=True, progressive=True)
+        else:
+            image.save(buffer, 'PNG', optimize=True)
+        return buffer.getvalue(), output_format
+    
+    @staticmethod
+    def _data_url(image_bytes, mime_type):
+        base64_str = base64.b64encode(image_bytes).decode('utf-8')
+        return f"data:image/{mime_type};base64,{base64_str}"
+
+
+# 参考图负载缓存：(图片内容哈希, 目标尺寸, 参数) -> data URL
+_payload_cache = {}
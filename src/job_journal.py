@@ -0,0 +1,122 @@
+import json
+import os
+import threading
+import time
+
+# 日志中的阶段
+#   prompt_enhanced : user_input, enhanced_prompt
+#   images_generated: image_paths
+#   image_selected  : image_path
+#   actions_selected: actions
+#   model_selected  : model
+#   task_created    : action, task_id, model, created
+#   video_downloaded: action, path
+#   sprites_built   : action, path
+STAGES = (
+    'prompt_enhanced', 'images_generated', 'image_selected', 'actions_selected',
+    'model_selected', 'task_created', 'video_downloaded', 'sprites_built',
+)
+
+
+class JobJournal:
+    """会话的追加式作业日志（JSONL）
+
+    每完成一个阶段追加一行并立即落盘，进程崩溃或被终止后可以按日志恢复到中断的位置，
+    已创建的视频任务会重新接管而不是重新生成。多个线程可以同时写入。
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.state = self._replay()
+        self._terminate_partial_line()
+
+    def record(self, stage, **fields):
+        """追加一条阶段记录"""
+        if stage not in STAGES:
+            raise ValueError(f"未知的日志阶段: {stage}")
+        entry = {'stage': stage, 'time': time.time(), **fields}
+        line = json.dumps(entry, ensure_ascii=False)
+
+        with self._lock:
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(line + '\n')
+                f.flush()
+                os.fsync(f.fileno())
+            self._apply(self.state, entry)
+
+    def get(self, key, default=None):
+        """读取恢复后的状态，例如 get('enhanced_prompt')"""
+        with self._lock:
+            return self.state.get(key, default)
+
+    def task(self, action):
+        """该动作已创建的视频任务 {task_id, model, created}，没有时返回None"""
+        with self._lock:
+            return self.state['tasks'].get(action)
+
+    def video(self, action):
+        """该动作已下载且仍存在的视频路径"""
+        with self._lock:
+            path = self.state['videos'].get(action)
+        return path if path and os.path.exists(path) else None
+
+    def sprite(self, action):
+        """该动作已生成且仍存在的精灵图路径"""
+        with self._lock:
+            path = self.state['sprites'].get(action)
+        return path if path and os.path.exists(path) else None
+
+    def _terminate_partial_line(self):
+        """上次写入被中断时补上换行，避免新记录与残缺行拼在一起"""
+        if not os.path.exists(self.path) or os.path.getsize(self.path) == 0:
+            return
+        with open(self.path, 'rb+') as f:
+            f.seek(-1, os.SEEK_END)
+            if f.read(1) != b'\n':
+                f.write(b'\n')
+
+    def _replay(self):
+        """读取已有日志，重建各阶段的状态"""
+        state = {'tasks': {}, 'videos': {}, 'sprites': {}}
+        if not os.path.exists(self.path):
+            return state
+
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    # 最后一行可能在写入时被中断
+                    continue
+                self._apply(state, entry)
+        return state
+
+    @staticmethod
+    def _apply(state, entry):
+        stage = entry['stage']
+        if stage == 'prompt_enhanced':
+            state['user_input'] = entry['user_input']
+            state['enhanced_prompt'] = entry['enhanced_prompt']
+        elif stage == 'images_generated':
+            state['image_paths'] = entry['image_paths']
+        elif stage == 'image_selected':
+            state['selected_image'] = entry['image_path']
+        elif stage == 'actions_selected':
+            state['actions'] = entry['actions']
+        elif stage == 'model_selected':
+            state['model'] = entry['model']
+        elif stage == 'task_created':
+            state['tasks'][entry['action']] = {
+                'task_id': entry['task_id'],
+                'model': entry.get('model'),
+                'created': entry.get('created', entry['time']),
+            }
+        elif stage == 'video_downloaded':
+            state['videos'][entry['action']] = entry['path']
+        elif stage == 'sprites_built':
+            state['sprites'][entry['action']] = entry['path']
@@ -0,0 +1,323 @@
+import cv2
+import numpy as np
+from PIL import Image
+from rembg import remove
+
+# 各模型的预处理参数（与rembg中对应session的predict保持一致）: (mean, std, 输入尺寸)
+MODEL_SPECS = {
+    'u2net': ((0.485, 0.456, 0.406), (0.229, 0.224, 0.225), (320, 320)),
+    'u2netp': ((0.485, 0.456, 0.406), (0.229, 0.224, 0.225), (320, 320)),
+    'u2net_human_seg': ((0.485, 0.456, 0.406), (0.229, 0.224, 0.225), (320, 320)),
+    'isnet-anime': ((0.485, 0.456, 0.406), (1.0, 1.0, 1.0), (1024, 1024)),
+    'isnet-general-use': ((0.485, 0.456, 0.406), (1.0, 1.0, 1.0), (1024, 1024)),
+}
+
+# 默认的alpha matting参数
+DEFAULT_ALPHA_MATTING = {
+    'alpha_matting': True,
+    'alpha_matting_foreground_threshold': 270,
+    'alpha_matting_background_threshold': 10,
+    'alpha_matting_erode_size': 10,
+}
+
+# 默认的时域复用参数
+DEFAULT_TEMPORAL = {
+    'enabled': False,
+    'pixel_threshold': 10,       # 灰度差超过该值的像素视为发生变化
+    'static_ratio': 0.002,       # 变化像素占比低于该值时直接复用上一帧mask
+    'region_max_ratio': 0.3,     # 变化区域包围盒占比不超过该值时只推理该区域
+    'region_margin': 32,         # 局部推理区域向外扩展的像素数
+    'keyframe_interval': 12,     # 连续复用/局部推理的最大帧数，超过后强制整帧推理
+}
+
+# 边缘细化预设：alpha_matting为rembg的全图closed-form matting，
+# guided_*只在mask边缘的不确定带内做导向滤波，none直接使用模型mask
+REFINEMENT_PRESETS = {
+    'alpha_matting': None,
+    'guided_quality': {'band': 12, 'radius': 8, 'eps': 1e-4},
+    'guided_fast': {'band': 6, 'radius': 4, 'eps': 1e-3},
+    'none': None,
+}
+
+# 计算帧差时的降采样步长
+DIFF_STRIDE = 4
+
+
+class _PrecomputedMask:
+    """供rembg.remove使用的会话：predict直接返回已推理好的mask"""
+
+    def __init__(self, mask):
+        self.mask = mask
+
+    def predict(self, img, *args, **kwargs):
+        return [self.mask]
+
+
+class MattingEngine:
+    """批量抠图引擎：多帧合并为一个张量，每批只调用一次ONNX推理"""
+
+    def __init__(self, session, model_name, batch_size=8, matting_params=None, temporal=None,
+                 refinement='alpha_matting'):
+        self.session = session
+        self.model_name = model_name
+        self.batch_size = max(1, int(batch_size))
+        self.matting_params = dict(DEFAULT_ALPHA_MATTING)
+        if matting_params:
+            self.matting_params.update(matting_params)
+        if refinement not in REFINEMENT_PRESETS:
+            raise ValueError(f"未知的边缘细化模式: {refinement}")
+        self.refinement = refinement
+        self.temporal = dict(DEFAULT_TEMPORAL)
+        if temporal:
+            self.temporal.update(temporal)
+        self.stats = {}
+        self.reset()
+
+        # 不在参数表中的模型（如多输出的u2net_cloth_seg）退回rembg逐帧处理
+        self.spec = MODEL_SPECS.get(model_name)
+        self.supports_batching = self.spec is not None
+
+        # 部分ONNX导出的batch维度是固定的1，此时只能逐帧推理
+        if self.supports_batching:
+            model_input = self.session.inner_session.get_inputs()[0]
+            self.input_name = model_input.name
+            self.fixed_batch = model_input.shape[0] == 1
+
+    def process(self, frames, reset=True):
+        """处理帧序列（RGB数组），逐个产出RGBA数组
+
+        reset为False时沿用上一次调用的参考帧和统计，用于分段送入同一段视频
+        """
+        if reset:
+            self.reset()
+
+        if not self.supports_batching:
+            for frame in frames:
+                self.stats['inferred'] += 1
+                if self.refinement == 'alpha_matting':
+                    yield remove(frame, session=self.session, **self.matting_params)
+                else:
+                    mask = remove(frame, session=self.session, only_mask=True)
+                    yield self.cutout(frame, Image.fromarray(mask, mode='L'))
+            return
+
+        process_batch = self._process_batch_temporal if self.temporal['enabled'] else self._process_batch
+
+        batch = []
+        for frame in frames:
+            batch.append(frame)
+            if len(batch) >= self.batch_size:
+                yield from process_batch(batch)
+                batch = []
+        if batch:
+            yield from process_batch(batch)
+
+    def cache_params(self):
+        """影响抠图结果的参数（用作缓存键的一部分）"""
+        return {
+            'matting': self.matting_params,
+            'refinement': self.refinement,
+            'temporal': self.temporal if self.temporal['enabled'] else None
+        }
+
+    def predict_masks(self, frames):
+        """对一批帧进行推理，返回与原帧同尺寸的mask（PIL L模式）"""
+        tensor = self._preprocess(frames)
+
+        if self.fixed_batch or len(frames) == 1:
+            preds = [self._run(tensor[i:i + 1]) for i in range(len(frames))]
+            pred = np.concatenate(preds, axis=0)
+        else:
+            pred = self._run(tensor)
+
+        return self._postprocess(pred, frames)
+
+    def _process_batch(self, frames):
+        """推理并根据mask生成抠图结果"""
+        masks = self.predict_masks(frames)
+        self.stats['inferred'] += len(frames)
+        for frame, mask in zip(frames, masks):
+            yield self.cutout(frame, mask)
+
+    def reset(self):
+        """每段视频开始时重置参考帧和统计"""
+        self.reset_reference()
+        self.stats = {'inferred': 0, 'region': 0, 'reused': 0}
+
+    def reset_reference(self):
+        """清除增量抠图的参考帧：下一帧与上一帧不相邻时调用，下一帧会做整帧推理"""
+        self._ref_signature = None
+        self._ref_mask = None
+        self._frames_since_keyframe = 0
+
+    def _process_batch_temporal(self, frames):
+        """增量抠图：静止帧复用mask，局部变化只推理变化区域"""
+        # 1. 只根据输入像素决定每帧的处理方式，并收集需要推理的图像
+        plans = []
+        jobs = []
+        for frame in frames:
+            kind, bbox = self._plan_frame(frame)
+            if kind == 'full':
+                jobs.append(frame)
+            elif kind == 'region':
+                x0, y0, x1, y1 = bbox
+                jobs.append(frame[y0:y1, x0:x1])
+            plans.append((kind, bbox))
+
+        # 2. 整帧和局部区域合并为一个批次推理（预处理会统一缩放到模型输入尺寸）
+        masks = iter(self.predict_masks(jobs)) if jobs else iter(())
+
+        # 3. 按顺序合成每帧的mask
+        for frame, (kind, bbox) in zip(frames, plans):
+            if kind == 'full':
+                self._ref_mask = np.array(next(masks))
+                self.stats['inferred'] += 1
+            elif kind == 'region':
+                x0, y0, x1, y1 = bbox
+                mask = self._ref_mask.copy()
+                mask[y0:y1, x0:x1] = np.asarray(next(masks))
+                self._ref_mask = mask
+                self.stats['region'] += 1
+            else:
+                self.stats['reused'] += 1
+
+            yield self.cutout(frame, Image.fromarray(self._ref_mask, mode='L'))
+
+    def _plan_frame(self, frame):
+        """与参考帧比较，返回 ('full' | 'region' | 'reused', 包围盒)"""
+        signature = self._diff_signature(frame)
+        ref = self._ref_signature
+
+        if (ref is None or ref.shape != signature.shape
+                or self._frames_since_keyframe >= self.temporal['keyframe_interval']):
+            self._ref_signature = signature
+            self._frames_since_keyframe = 0
+            return 'full', None
+
+        changed = np.abs(signature - ref) > self.temporal['pixel_threshold']
+        self._frames_since_keyframe += 1
+
+        # 变化极小：直接复用mask，参考帧保持不变以免缓慢漂移被忽略
+        if changed.mean() <= self.temporal['static_ratio']:
+            return 'reused', None
+
+        # 变化集中在小区域：只推理该区域的包围盒
+        rows = np.flatnonzero(changed.any(axis=1))
+        cols = np.flatnonzero(changed.any(axis=0))
+        height, width = frame.shape[:2]
+        margin = self.temporal['region_margin']
+        x0 = max(0, cols[0] * DIFF_STRIDE - margin)
+        y0 = max(0, rows[0] * DIFF_STRIDE - margin)
+        x1 = min(width, (cols[-1] + 1) * DIFF_STRIDE + margin)
+        y1 = min(height, (rows[-1] + 1) * DIFF_STRIDE + margin)
+
+        self._ref_signature = signature
+        if (x1 - x0) * (y1 - y0) <= self.temporal['region_max_ratio'] * width * height:
+            return 'region', (x0, y0, x1, y1)
+
+        self._frames_since_keyframe = 0
+        return 'full', None
+
+    def _diff_signature(self, frame):
+        """降采样灰度图，用于快速计算帧差"""
+        return frame[::DIFF_STRIDE, ::DIFF_STRIDE].mean(axis=2, dtype=np.float32)
+
+    def cutout(self, frame, mask):
+        """根据mask抠出前景（alpha_matting模式与rembg.remove的后处理一致）"""
+        preset = REFINEMENT_PRESETS[self.refinement]
+        if preset is not None:
+            alpha = refine_alpha_band(frame, np.asarray(mask), **preset)
+            # 与rembg的cutout一致：完全透明的像素输出(0,0,0,0)，不保留原视频背景
+            rgba = np.dstack([frame, alpha])
+            rgba[alpha == 0] = 0
+            return rgba
+
+        # 后处理交给rembg.remove（方向校正、alpha matting及其失败时的退回方式都随rembg版本一致），
+        # 只把推理替换为已批量算好的mask
+        params = self.matting_params if self.refinement == 'alpha_matting' else {}
+        return remove(frame, session=_PrecomputedMask(mask), **params)
+
+    def _preprocess(self, frames):
+        """将N帧预处理为 (N, 3, H, W) 的float32张量"""
+        mean, std, size = self.spec
+
+        # 缩放沿用PIL的LANCZOS，保证与rembg单帧推理的输入一致
+        resized = np.stack([
+            np.asarray(Image.fromarray(frame).convert('RGB').resize(size, Image.Resampling.LANCZOS))
+            for frame in frames
+        ]).astype(np.float64)
+
+        # 每帧按自身最大值归一化，再做通道标准化
+        max_vals = resized.reshape(len(frames), -1).max(axis=1).reshape(-1, 1, 1, 1)
+        resized /= np.maximum(max_vals, 1e-8)
+        resized = (resized - np.array(mean)) / np.array(std)
+
+        return resized.transpose(0, 3, 1, 2).astype(np.float32)
+
+    def _run(self, tensor):
+        """执行ONNX推理，返回 (N, H, W) 的预测结果"""
+        ort_outs = self.session.inner_session.run(None, {self.input_name: tensor})
+        return ort_outs[0][:, 0, :, :]
+
+    def _postprocess(self, pred, frames):
+        """逐帧min-max归一化，并把mask缩放回原帧尺寸"""
+        flat = pred.reshape(len(frames), -1)
+        mi = flat.min(axis=1).reshape(-1, 1, 1)
+        ma = flat.max(axis=1).reshape(-1, 1, 1)
+        pred = (pred - mi) / np.maximum(ma - mi, 1e-8)
+        pred = (pred * 255).astype(np.uint8)
+
+        masks = []
+        for frame, mask in zip(frames, pred):
+            height, width = frame.shape[:2]
+            mask_img = Image.fromarray(mask, mode='L').resize((width, height), Image.Resampling.LANCZOS)
+            masks.append(mask_img)
+        return masks
+
+
+def refine_alpha_band(frame, mask, band=12, radius=8, eps=1e-4):
+    """只在mask边缘的不确定带内用导向滤波细化alpha
+
+    mask二值化后，膨胀与腐蚀之差构成不确定带；带外直接取0/255，
+    带内使用以原图灰度为引导的导向滤波结果。滤波只在不确定带的包围盒内计算。
+    """
+    binary = (mask >= 128).astype(np.uint8)
+    kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (2 * band + 1, 2 * band + 1))
+    unknown = cv2.dilate(binary, kernel) > cv2.erode(binary, kernel)
+
+    alpha = binary * np.uint8(255)
+    if not unknown.any():
+        return alpha
+
+    # 不确定带的包围盒，向外扩展滤波半径以保证窗口完整
+    rows = np.flatnonzero(unknown.any(axis=1))
+    cols = np.flatnonzero(unknown.any(axis=0))
+    height, width = mask.shape
+    y0, y1 = max(0, rows[0] - radius), min(height, rows[-1] + radius + 1)
+    x0, x1 = max(0, cols[0] - radius), min(width, cols[-1] + radius + 1)
+
+    guide = cv2.cvtColor(frame[y0:y1, x0:x1], cv2.COLOR_RGB2GRAY).astype(np.float32) / 255.0
+    p = mask[y0:y1, x0:x1].astype(np.float32) / 255.0
+    q = _guided_filter(guide, p, radius, eps)
+
+    region = unknown[y0:y1, x0:x1]
+    refined = alpha[y0:y1, x0:x1]
+    refined[region] = np.clip(q[region] * 255.0 + 0.5, 0, 255).astype(np.uint8)
+    return alpha
+
+
+def _guided_filter(guide, p, radius, eps):
+    """灰度引导的导向滤波（He et al.），全部由盒式滤波构成"""
+    ksize = (2 * radius + 1, 2 * radius + 1)
+
+    def box(x):
+        return cv2.boxFilter(x, -1, ksize, borderType=cv2.BORDER_REFLECT)
+
+    mean_i = box(guide)
+    mean_p = box(p)
+    cov_ip = box(guide * p) - mean_i * mean_p
+    var_i = box(guide * guide) - mean_i * mean_i
+
+    a = cov_ip / (var_i + eps)
+    b = mean_p - a * mean_i
+    return box(a) * guide + box(b)
@@ -0,0 +1,124 @@
+import hashlib
+import json
+import os
+import threading
+import cv2
+import numpy as np
+
+class MattingCache:
+    """抠图结果的持久化缓存：以帧内容哈希 + 模型 + 抠图参数为键，超出容量时按LRU淘汰"""
+
+    def __init__(self, cache_dir="./cache/matting", max_size_mb=2048):
+        self.cache_dir = cache_dir
+        self.max_size = int(max_size_mb * 1024 * 1024)
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        os.makedirs(cache_dir, exist_ok=True)
+        self._total_size = sum(size for _, size, _ in self._scan())
+
+    def key(self, frame, model_name, params):
+        """计算缓存键"""
+        h = hashlib.blake2b(digest_size=20)
+        h.update(str(frame.shape).encode())
+        h.update(np.ascontiguousarray(frame).data)
+        h.update(model_name.encode())
+        h.update(json.dumps(params, sort_keys=True).encode())
+        return h.hexdigest()
+
+    def get(self, key):
+        """读取缓存的RGBA结果，未命中返回None"""
+        path = self._path(key)
+        try:
+            data = np.fromfile(path, dtype=np.uint8)
+        except (FileNotFoundError, OSError):
+            data = None
+
+        result = None
+        if data is not None and data.size:
+            decoded = cv2.imdecode(data, cv2.IMREAD_UNCHANGED)
+            if decoded is not None:
+                result = cv2.cvtColor(decoded, cv2.COLOR_BGRA2RGBA)
+
+        with self._lock:
+            if result is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+
+        # 更新访问时间，作为LRU依据
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return result
+
+    def put(self, key, rgba):
+        """写入缓存（先写临时文件再原子替换，多进程同时写入也不会读到残缺文件）"""
+        path = self._path(key)
+        if os.path.exists(path):
+            return
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        ok, encoded = cv2.imencode('.png', cv2.cvtColor(rgba, cv2.COLOR_RGBA2BGRA),
+                                   [cv2.IMWRITE_PNG_COMPRESSION, 1])
+        if not ok:
+            return
+
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        encoded.tofile(tmp_path)
+        os.replace(tmp_path, path)
+
+        with self._lock:
+            self._total_size += encoded.size
+            need_evict = self._total_size > self.max_size
+        if need_evict:
+            self._evict()
+
+    def stats(self):
+        """命中统计"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / total if total else 0.0,
+                'size_bytes': self._total_size
+            }
+
+    def _evict(self):
+        """按最近访问时间淘汰，直到低于容量上限的90%"""
+        with self._lock:
+            entries = sorted(self._scan(), key=lambda e: e[2])
+            total = sum(size for _, size, _ in entries)
+            target = self.max_size * 0.9
+
+            for path, size, _ in entries:
+                if total <= target:
+                    break
+                try:
+                    os.remove(path)
+                    total -= size
+                except OSError:
+                    pass
+            self._total_size = total
+
+    def _scan(self):
+        """遍历缓存目录，返回 (路径, 大小, 访问时间)"""
+        entries = []
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                if not name.endswith('.png'):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((path, st.st_size, st.st_mtime))
+        return entries
+
+    def _path(self, key):
+        """按键的前两位分目录存放"""
+        return os.path.join(self.cache_dir, key[:2], f"{key}.png")
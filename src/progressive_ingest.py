@@ -0,0 +1,180 @@
+import os
+import queue
+import shutil
+import struct
+import tempfile
+import threading
+from .downloader import get_downloader
+
+# 判断容器布局时最多缓存的文件头字节数
+PROBE_LIMIT = 4 * 1024 * 1024
+
+
+class RemoteVideo:
+    """尚未下载的视频：url为下载地址，path为下载完成后的本地路径"""
+
+    def __init__(self, url, path):
+        self.url = url
+        self.path = path
+
+    def __repr__(self):
+        return f"RemoteVideo({self.path})"
+
+
+def probe_mp4_layout(head):
+    """根据文件头的顶层box判断MP4能否边下载边解码
+
+    Returns:
+        'streamable' : moov在mdat之前（faststart）或为分片MP4，可以顺序解码
+        'needs_full' : mdat在moov之前，解码需要文件末尾的moov
+        None         : 数据还不够判断
+    """
+    offset = 0
+    while offset + 8 <= len(head):
+        size, box = struct.unpack('>I4s', head[offset:offset + 8])
+        if size == 1:
+            if offset + 16 > len(head):
+                return None
+            size = struct.unpack('>Q', head[offset + 8:offset + 16])[0]
+
+        if box in (b'moov', b'moof'):
+            return 'streamable'
+        if box == b'mdat' or size == 0:
+            return 'needs_full'
+        if size < 8:
+            # 不是合法的MP4结构，交给完整文件解码
+            return 'needs_full'
+        offset += size
+    return None
+
+
+class ProgressiveIngest:
+    """边下载边解码
+
+    下载线程把数据同时写入 <path>.part 和一个命名管道（FIFO），OpenCV从管道中按顺序解码，
+    解码与剩余数据的传输重叠。容器需要完整文件（moov在末尾）或系统不支持FIFO时，
+    start()返回None，调用方应等待下载完成后按普通文件处理。
+    """
+
+    def __init__(self, url, path, downloader=None):
+        self.url = url
+        self.path = path
+        self.downloader = downloader or get_downloader()
+        self.layout = None
+        # 续传时服务器从头重发导致数据不连续，管道中的数据不完整，需要按完整文件重新处理
+        self.stream_broken = False
+
+        self._head = bytearray()
+        self._decided = threading.Event()
+        self._chunks = queue.Queue()
+        self._fed = 0
+        self._tmp_dir = None
+        self._fifo = None
+        self._error = None
+        self._download_thread = None
+        self._writer_thread = None
+
+    def start(self, stream=True):
+        """开始下载，返回可供解码的管道路径；无法边下载边解码时返回None
+
+        stream为False时只下载，不创建管道（调用方已确定需要完整文件）
+        """
+        if stream and hasattr(os, 'mkfifo'):
+            self._tmp_dir = tempfile.mkdtemp(prefix='ingest_')
+            self._fifo = os.path.join(self._tmp_dir, 'video.mp4')
+            os.mkfifo(self._fifo)
+
+        self._download_thread = threading.Thread(target=self._download, daemon=True)
+        self._download_thread.start()
+        if self._fifo is None:
+            return None
+        self._decided.wait()
+
+        if self.layout != 'streamable':
+            return None
+
+        self._writer_thread = threading.Thread(target=self._write_fifo, daemon=True)
+        self._writer_thread.start()
+        return self._fifo
+
+    def wait(self):
+        """等待下载完成，下载失败时抛出异常"""
+        self._download_thread.join()
+        if self._error is not None:
+            raise self._error
+
+    def close(self):
+        """结束管道写入并清理临时文件"""
+        if self._writer_thread is not None and self._writer_thread.is_alive():
+            # 解码方没有打开管道时，写线程会阻塞在open上，这里打开一次读端解除阻塞
+            try:
+                fd = os.open(self._fifo, os.O_RDONLY | os.O_NONBLOCK)
+                os.close(fd)
+            except OSError:
+                pass
+            self._writer_thread.join(timeout=5)
+        if self._tmp_dir is not None:
+            shutil.rmtree(self._tmp_dir, ignore_errors=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def _download(self):
+        try:
+            self.downloader.download(self.url, self.path, on_data=self._on_data)
+        except Exception as e:
+            self._error = e
+        finally:
+            # 文件头过小时下载结束仍未判定，按完整文件处理
+            if self.layout is None:
+                self.layout = 'needs_full'
+            self._decided.set()
+            self._chunks.put(None)
+
+    def _on_data(self, offset, data):
+        """下载回调：判断容器布局，并把新数据按顺序交给管道写线程"""
+        if self._fifo is None:
+            return
+        if self.layout is None:
+            if offset != len(self._head):
+                self.layout = 'needs_full'
+            else:
+                self._head.extend(data)
+                self.layout = probe_mp4_layout(self._head)
+                if self.layout is None and len(self._head) >= PROBE_LIMIT:
+                    self.layout = 'needs_full'
+            if self.layout is None:
+                return
+            self._decided.set()
+            if self.layout != 'streamable':
+                return
+            # 已缓存的文件头作为第一块送入管道
+            offset, data = 0, bytes(self._head)
+            self._head = bytearray()
+        elif self.layout != 'streamable' or self.stream_broken:
+            return
+
+        # 按偏移去重：续传可能重发已经送入管道的数据
+        end = offset + len(data)
+        if end <= self._fed:
+            return
+        if offset > self._fed:
+            self.stream_broken = True
+            return
+        self._chunks.put(data[self._fed - offset:])
+        self._fed = end
+
+    def _write_fifo(self):
+        """把下载的数据写入管道；解码方提前关闭管道时丢弃剩余数据"""
+        try:
+            with open(self._fifo, 'wb') as pipe:
+                while True:
+                    data = self._chunks.get()
+                    if data is None:
+                        break
+                    pipe.write(data)
+        except (BrokenPipeError, OSError):
+            pass
@@ -0,0 +1,108 @@
+import hashlib
+import json
+import os
+import sqlite3
+import time
+
+
+class PromptCache:
+    """提示词润色结果的持久化缓存（SQLite）
+
+    以用户输入 + 模板 + 模型为键；条目超过ttl_hours未更新即过期，总数超过max_entries时
+    按最近使用时间淘汰。每次操作使用独立连接并开启WAL，多个进程可以同时读写。
+    """
+
+    def __init__(self, path="./cache/prompts.sqlite", max_entries=10000, ttl_hours=24 * 30):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl_hours * 3600 if ttl_hours else None
+        self.hits = 0
+        self.misses = 0
+
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS prompts ("
+                " key TEXT PRIMARY KEY,"
+                " value TEXT NOT NULL,"
+                " created REAL NOT NULL,"
+                " last_used REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS prompts_last_used ON prompts(last_used)")
+
+    @staticmethod
+    def key(user_input, template, model):
+        """计算缓存键"""
+        payload = json.dumps([user_input, template, model], ensure_ascii=False)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def get(self, key):
+        """读取缓存，未命中或已过期返回None"""
+        now = time.time()
+        with self._connect() as conn:
+            row = conn.execute("SELECT value, created FROM prompts WHERE key = ?", (key,)).fetchone()
+            if row is not None and self.ttl and now - row[1] > self.ttl:
+                conn.execute("DELETE FROM prompts WHERE key = ?", (key,))
+                row = None
+            if row is not None:
+                conn.execute("UPDATE prompts SET last_used = ? WHERE key = ?", (now, key))
+
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return row[0]
+
+    def put(self, key, value):
+        """写入缓存，并在超出容量时淘汰最久未使用的条目"""
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO prompts (key, value, created, last_used) VALUES (?, ?, ?, ?)",
+                (key, value, now, now)
+            )
+            if self.ttl:
+                conn.execute("DELETE FROM prompts WHERE created < ?", (now - self.ttl,))
+            if self.max_entries:
+                conn.execute(
+                    "DELETE FROM prompts WHERE key IN ("
+                    " SELECT key FROM prompts ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                    (self.max_entries,)
+                )
+
+    def stats(self):
+        """命中统计"""
+        with self._connect() as conn:
+            entries = conn.execute("SELECT COUNT(*) FROM prompts").fetchone()[0]
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total else 0.0,
+            'entries': entries
+        }
+
+    def _connect(self):
+        # 写入冲突时等待其他进程释放锁，而不是立即报错
+        conn = sqlite3.connect(self.path, timeout=30)
+        return _Transaction(conn)
+
+
+class _Transaction:
+    """with块结束时提交（出错时回滚）并关闭连接"""
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            if exc_type is None:
+                self.conn.commit()
+            else:
+                self.conn.rollback()
+        finally:
+            self.conn.close()
@@ -1,20 +1,121 @@
 import json
 from openai import OpenAI
+from .prompt_cache import PromptCache
 
 class PromptEnhancer:
     def __init__(self, config_path="config.json"):
         with open(config_path, 'r') as f:
             self.config = json.load(f)
         self.client = OpenAI()
-        
+        self._cache = None
+    
     def enhance(self, user_input):
-        """使用GPT-4.1润色用户输入的提示词"""
-        template = self.config['prompt_enhancement']['template']
-        prompt = template.format(user_input=user_input)
+        """使用GPT-4.1润色用户输入的提示词（结果持久化缓存）"""
+        cache = self._get_cache()
+        key = self._cache_key(user_input)
+        if cache is not None:
+            cached = cache.get(key)
+            if cached is not None:
+                print("    ✓ 使用缓存的润色结果")
+                return cached
+        
+        enhanced = self._request(self._build_prompt(user_input))
+        
+        if cache is not None:
+            cache.put(key, enhanced)
+        return enhanced
+    
+    def enhance_batch(self, user_inputs):
+        """润色多个输入，返回与输入顺序一致的列表（批量模式的润色阶段使用）
+        
+        已缓存的输入直接返回；开启 prompt_enhancement.batch 时，未缓存的输入合并为
+        一次请求发送，否则逐个请求。合并请求的结果无法解析时回退为逐个请求。
+        """
+        cache = self._get_cache()
+        results = {}
+        pending = []
+        for user_input in dict.fromkeys(user_inputs):
+            cached = cache.get(self._cache_key(user_input)) if cache is not None else None
+            if cached is not None:
+                results[user_input] = cached
+            else:
+                pending.append(user_input)
+        
+        if pending:
+            print(f"    润色提示词: {len(results)} 个命中缓存，{len(pending)} 个需要请求")
+        
+        batch_config = self.config['prompt_enhancement'].get('batch', {})
+        if batch_config.get('enabled', False) and len(pending) > 1:
+            batch_size = batch_config.get('max_size', 20)
+            for start in range(0, len(pending), batch_size):
+                group = pending[start:start + batch_size]
+                enhanced = self._request_batch(group)
+                if enhanced is None:
+                    continue
+                for user_input, text in zip(group, enhanced):
+                    results[user_input] = text
+                    if cache is not None:
+                        cache.put(self._cache_key(user_input), text)
         
+        for user_input in pending:
+            if user_input not in results:
+                results[user_input] = self.enhance(user_input)
+        
+        return [results[user_input] for user_input in user_inputs]
+    
+    def _build_prompt(self, user_input):
+        template = self.config['prompt_enhancement']['template']
+        return template.format(user_input=user_input)
+    
+    def _request(self, prompt):
         response = self.client.responses.create(
             model=self.config['prompt_enhancement']['model'],
             input=prompt
         )
         
-        return response.output_text
\ No newline at end of file
+        return response.output_text
+    
+    def _request_batch(self, user_inputs):
+        """把多个润色请求合并为一次调用，返回结果列表；无法解析时返回None"""
+        sections = [f"### 请求 {i}\n{self._build_prompt(user_input)}"
+                    for i, user_input in enumerate(user_inputs, 1)]
+        prompt = (
+            f"下面有 {len(user_inputs)} 个相互独立的请求，请分别完成。"
+            f"只输出一个包含 {len(user_inputs)} 个字符串的JSON数组，第i个元素是第i个请求的完整回答，"
+            f"不要输出其他内容。\n\n" + "\n\n".join(sections)
+        )
+        text = self._request(prompt).strip()
+        
+        # 去掉可能的代码块标记
+        if text.startswith("```"):
+            text = text.strip('`')
+            text = text[text.find('\n') + 1:] if '\n' in text else text
+        
+        try:
+            enhanced = json.loads(text)
+        except json.JSONDecodeError:
+            print("    ⚠️  合并请求的结果无法解析，改为逐个请求")
+            return None
+        
+        if (not isinstance(enhanced, list) or len(enhanced) != len(user_inputs)
+                or not all(isinstance(item, str) and item.strip() for item in enhanced)):
+            print("    ⚠️  合并请求的结果数量不符，改为逐个请求")
+            return None
+        return enhanced
+    
+    def _cache_key(self, user_input):
+        enhance_config = self.config['prompt_enhancement']
+        return PromptCache.key(user_input, enhance_config['template'], enhance_config['model'])
+    
+    def _get_cache(self):
+        """按配置创建提示词缓存，未开启时返回None"""
+        cache_config = self.config['prompt_enhancement'].get('cache', {})
+        if not cache_config.get('enabled', True):
+            return None
+        if self._cache is None:
+            self._cache = PromptCache(
+                cache_config.get('path', './cache/prompts.sqlite'),
+                cache_config.get('max_entries', 10000),
+                cache_config.get('ttl_hours', 24 * 30)
+            )
+        return self._cache
@@ -0,0 +1,182 @@
+import os
+import threading
+import time
+
+# 默认会话池参数
+#   memory_budget_mb: 已加载模型的内存预算，超出时按最近使用时间淘汰空闲的会话
+#   providers       : onnxruntime执行后端，为空时使用rembg的默认值
+DEFAULT_OPTIONS = {
+    'memory_budget_mb': 1024,
+    'providers': None,
+}
+
+# 找不到模型文件时按该大小估算会话占用的内存
+_DEFAULT_MODEL_SIZE = 200 * 1024 * 1024
+
+
+class _Entry:
+    def __init__(self, key, session, size, load_seconds):
+        self.key = key
+        self.session = session
+        self.size = size
+        self.load_seconds = load_seconds
+        self.refs = 0
+        self.hits = 0
+        self.last_used = time.monotonic()
+
+
+class SessionPool:
+    """进程内共享的rembg会话池
+
+    会话按 (模型名, 执行后端, onnxruntime线程数) 缓存，多个FrameProcessor或线程使用同一模型时
+    共用一个会话；同一会话同时只加载一次，其他请求等待加载完成。
+    acquire()取得的会话在release()之前不会被淘汰；已加载模型的估算内存（模型文件大小）超过
+    预算时，按最近使用时间淘汰未被使用的会话。
+    """
+
+    def __init__(self, options=None):
+        self.options = dict(DEFAULT_OPTIONS)
+        if options:
+            self.options.update(options)
+
+        self._entries = {}
+        self._loading = {}
+        self._lock = threading.Lock()
+        self.loads = 0
+        self.hits = 0
+        self.evictions = 0
+        self.load_seconds = 0.0
+
+    def key(self, model_name, providers=None):
+        """会话的缓存键：rembg按OMP_NUM_THREADS设置onnxruntime线程数，线程数不同的会话不能共用"""
+        providers = providers if providers is not None else self.options['providers']
+        return (model_name, tuple(providers or ()), os.environ.get('OMP_NUM_THREADS'))
+
+    def is_loaded(self, model_name, providers=None):
+        with self._lock:
+            return self.key(model_name, providers) in self._entries
+
+    def acquire(self, model_name, providers=None):
+        """取得模型的会话（未加载时加载），用完后调用release()"""
+        key = self.key(model_name, providers)
+        while True:
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None:
+                    entry.refs += 1
+                    entry.hits += 1
+                    entry.last_used = time.monotonic()
+                    self.hits += 1
+                    return entry.session
+
+                loading = self._loading.get(key)
+                if loading is None:
+                    # 由当前线程加载；加载前先腾出空间，降低内存峰值
+                    loading = self._loading[key] = threading.Event()
+                    self._evict(reserve=self._model_size(model_name))
+                    break
+            # 其他线程正在加载同一会话：等待后重新查找（加载失败时由本线程重试）
+            loading.wait()
+
+        try:
+            entry = self._load(key)
+        finally:
+            with self._lock:
+                del self._loading[key]
+            loading.set()
+
+        with self._lock:
+            entry.refs += 1
+            self._entries[key] = entry
+            self.loads += 1
+            self.load_seconds += entry.load_seconds
+            self._evict()
+        return entry.session
+
+    def release(self, session):
+        """归还会话，归还后的会话可以被淘汰"""
+        with self._lock:
+            for entry in self._entries.values():
+                if entry.session is session:
+                    entry.refs = max(entry.refs - 1, 0)
+                    entry.last_used = time.monotonic()
+                    self._evict()
+                    return
+
+    def clear(self):
+        """释放所有未被使用的会话"""
+        with self._lock:
+            for key in [key for key, entry in self._entries.items() if entry.refs == 0]:
+                del self._entries[key]
+                self.evictions += 1
+
+    def stats(self):
+        """加载/命中/淘汰统计"""
+        with self._lock:
+            requests = self.loads + self.hits
+            return {
+                'loads': self.loads,
+                'hits': self.hits,
+                'hit_rate': self.hits / requests if requests else 0.0,
+                'evictions': self.evictions,
+                'load_seconds': self.load_seconds,
+                'memory_mb': self._memory_used() / 1024 / 1024,
+                'budget_mb': self.options['memory_budget_mb'],
+                'sessions': [
+                    {'model': entry.key[0], 'in_use': entry.refs, 'hits': entry.hits,
+                     'size_mb': entry.size / 1024 / 1024, 'load_seconds': entry.load_seconds}
+                    for entry in self._entries.values()
+                ],
+            }
+
+    def _load(self, key):
+        from rembg import new_session
+
+        model_name, providers, _ = key
+        start = time.perf_counter()
+        if providers:
+            session = new_session(model_name, providers=list(providers))
+        else:
+            session = new_session(model_name)
+        return _Entry(key, session, self._model_size(model_name), time.perf_counter() - start)
+
+    def _evict(self, reserve=0):
+        """淘汰最久未使用的空闲会话，直到内存占用（加上reserve）不超过预算"""
+        budget = self.options['memory_budget_mb'] * 1024 * 1024
+        idle = sorted((entry for entry in self._entries.values() if entry.refs == 0),
+                      key=lambda entry: entry.last_used)
+        used = self._memory_used()
+        for entry in idle:
+            if used + reserve <= budget:
+                break
+            del self._entries[entry.key]
+            used -= entry.size
+            self.evictions += 1
+
+    def _memory_used(self):
+        return sum(entry.size for entry in self._entries.values())
+
+    @staticmethod
+    def _model_size(model_name):
+        """按模型文件大小估算会话占用的内存（rembg把模型保存在U2NET_HOME）"""
+        home = os.getenv('U2NET_HOME', os.path.join(os.getenv('XDG_DATA_HOME', '~'), '.u2net'))
+        path = os.path.join(os.path.expanduser(home), f"{model_name}.onnx")
+        try:
+            return os.path.getsize(path)
+        except OSError:
+            return _DEFAULT_MODEL_SIZE
+
+
+_default_pool = None
+_default_lock = threading.Lock()
+
+
+def get_session_pool(options=None):
+    """进程内共享的会话池；传入options时更新其参数"""
+    global _default_pool
+    with _default_lock:
+        if _default_pool is None:
+            _default_pool = SessionPool(options)
+        elif options:
+            _default_pool.options.update(options)
+        return _default_pool
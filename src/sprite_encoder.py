@@ -0,0 +1,268 @@
+import os
+import struct
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from PIL import Image
+
+# 可选的精灵图编码器
+#   png          : Pillow单线程编码（optimize=True），与原有输出一致
+#   png_parallel : 按行条带多线程deflate压缩的PNG
+#   png_palette  : 带alpha的8位调色板PNG，调色板由同一动作的所有帧共同生成
+#   webp         : 有损WebP
+#   webp_lossless: 无损WebP
+ENCODERS = ('png', 'png_parallel', 'png_palette', 'webp', 'webp_lossless')
+
+# WebP单边最大尺寸
+WEBP_MAX_SIZE = 16383
+
+DEFAULT_OPTIONS = {
+    'png_level': 6,          # png_parallel的zlib压缩级别
+    'strip_rows': 64,        # png_parallel每个压缩条带的行数
+    'threads': None,         # png_parallel的线程数，默认CPU核数
+    'palette_colors': 256,   # png_palette的颜色数
+    'webp_quality': 90,      # webp的质量
+    'webp_method': 4,        # webp的压缩速度/体积权衡 (0-6)
+}
+
+
+def file_extension(encoder):
+    """编码器对应的文件扩展名"""
+    return '.webp' if encoder.startswith('webp') else '.png'
+
+
+def save_sprite_sheet(sheet, path, encoder='png', options=None, palette=None):
+    """按指定编码器保存RGBA精灵图
+
+    Args:
+        sheet: (高, 宽, 4) 的uint8数组
+        path: 不含扩展名的输出路径
+        encoder: ENCODERS中的一种
+        options: 覆盖DEFAULT_OPTIONS的参数
+        palette: png_palette使用的共享调色板（build_palette的结果），为空时按本图生成
+
+    Returns:
+        (实际写入的路径, 写入的字节数)
+    """
+    if encoder not in ENCODERS:
+        raise ValueError(f"未知的精灵图编码器: {encoder}")
+    opts = dict(DEFAULT_OPTIONS)
+    if options:
+        opts.update(options)
+
+    height, width = sheet.shape[:2]
+    if encoder.startswith('webp') and max(width, height) > WEBP_MAX_SIZE:
+        print(f"  ⚠️  精灵图尺寸 {width}x{height} 超出WebP上限，改用PNG")
+        encoder = 'png'
+
+    output_path = path + file_extension(encoder)
+
+    with open(output_path, 'wb') as f:
+        if encoder == 'png':
+            Image.fromarray(sheet, mode='RGBA').save(f, 'PNG', optimize=True)
+        elif encoder == 'png_parallel':
+            write_png_parallel(sheet, f, opts['png_level'], opts['strip_rows'], opts['threads'])
+        elif encoder == 'png_palette':
+            if palette is None:
+                palette = build_palette([sheet], opts['palette_colors'])
+            save_palette_png(sheet, palette, f)
+        elif encoder == 'webp':
+            Image.fromarray(sheet, mode='RGBA').save(
+                f, 'WEBP', quality=opts['webp_quality'], method=opts['webp_method'])
+        else:
+            Image.fromarray(sheet, mode='RGBA').save(
+                f, 'WEBP', lossless=True, quality=100, method=opts['webp_method'])
+        size = f.tell()
+
+    return output_path, size
+
+
+def build_palette(frames, colors=256, sample_size=200000, iterations=8, seed=0):
+    """对一组RGBA帧做k-means颜色量化，返回 (K, 4) 的调色板
+
+    0号颜色固定为全透明，其余颜色由所有帧中非透明像素的随机样本聚类得到。
+    """
+    rng = np.random.default_rng(seed)
+
+    # 从各帧中均匀抽取非透明像素
+    per_frame = max(1, sample_size // len(frames))
+    samples = []
+    for frame in frames:
+        pixels = frame.reshape(-1, 4)
+        opaque = pixels[pixels[:, 3] > 0]
+        if len(opaque) > per_frame:
+            opaque = opaque[rng.choice(len(opaque), per_frame, replace=False)]
+        samples.append(opaque)
+    samples = np.concatenate(samples).astype(np.float32)
+
+    transparent = np.zeros((1, 4), dtype=np.uint8)
+    k = min(colors - 1, len(np.unique(samples, axis=0))) if len(samples) else 0
+    if k <= 0:
+        return transparent
+
+    centers = samples[rng.choice(len(samples), k, replace=False)]
+    for _ in range(iterations):
+        labels = _nearest(samples, centers)
+        sums = np.zeros_like(centers)
+        np.add.at(sums, labels, samples)
+        counts = np.bincount(labels, minlength=k).astype(np.float32)
+        filled = counts > 0
+        centers[filled] = sums[filled] / counts[filled, None]
+
+    palette = np.clip(centers + 0.5, 0, 255).astype(np.uint8)
+    return np.concatenate([transparent, palette])
+
+
+def quantize(rgba, palette):
+    """将RGBA图像映射到调色板索引（全透明像素映射到0号颜色）"""
+    pixels = rgba.reshape(-1, 4)
+    indices = np.zeros(len(pixels), dtype=np.uint8)
+
+    opaque = pixels[:, 3] > 0
+    if opaque.any() and len(palette) > 1:
+        colors = palette[1:].astype(np.float32)
+        indices[opaque] = _nearest(pixels[opaque].astype(np.float32), colors) + 1
+
+    return indices.reshape(rgba.shape[:2])
+
+
+def save_palette_png(rgba, palette, f):
+    """保存为带tRNS透明度的8位调色板PNG"""
+    indices = quantize(rgba, palette)
+    image = Image.fromarray(indices, mode='P')
+    image.putpalette(palette[:, :3].tobytes())
+    image.save(f, 'PNG', optimize=True, transparency=palette[:, 3].tobytes())
+
+
+def _nearest(pixels, centers, chunk=65536):
+    """分块计算每个像素最近的颜色中心"""
+    labels = np.empty(len(pixels), dtype=np.int64)
+    center_sq = (centers ** 2).sum(axis=1)
+    for start in range(0, len(pixels), chunk):
+        block = pixels[start:start + chunk]
+        # |p - c|^2 = |p|^2 - 2 p·c + |c|^2，|p|^2对argmin无影响
+        dist = center_sq - 2.0 * block @ centers.T
+        labels[start:start + chunk] = np.argmin(dist, axis=1)
+    return labels
+
+
+def write_png_parallel(rgba, f, level=6, strip_rows=64, threads=None):
+    """多线程编码RGBA PNG
+
+    每个行条带独立做Sub滤波并用原始deflate压缩，非最后一段以Z_SYNC_FLUSH结尾，
+    拼接后仍是一个合法的zlib流（与pigz的做法相同）。zlib压缩时会释放GIL，线程可以并行。
+    """
+    height, width = rgba.shape[:2]
+    strips = [(y, min(y + strip_rows, height)) for y in range(0, height, strip_rows)]
+    threads = threads or os.cpu_count() or 1
+
+    def encode_strip(index):
+        y0, y1 = strips[index]
+        raw = filter_rows(rgba[y0:y1])
+        compressor = zlib.compressobj(level, zlib.DEFLATED, -15)
+        last = index == len(strips) - 1
+        data = compressor.compress(raw) + compressor.flush(zlib.Z_FINISH if last else zlib.Z_SYNC_FLUSH)
+        return data, zlib.adler32(raw), len(raw)
+
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        results = list(executor.map(encode_strip, range(len(strips))))
+
+    checksum = 1
+    for _, strip_adler, strip_len in results:
+        checksum = _adler32_combine(checksum, strip_adler, strip_len)
+
+    idat = b'\x78\x9c' + b''.join(data for data, _, _ in results) + struct.pack('>I', checksum)
+
+    write_png_header(f, width, height)
+    write_chunk(f, b'IDAT', idat)
+    write_chunk(f, b'IEND', b'')
+
+
+class StreamingPNGWriter:
+    """逐条带写入的RGBA PNG编码器
+
+    像素按行条带送入并立即压缩写盘，内存中只保留当前条带。
+    高度可以在结束时才确定：close()时回写IHDR中的高度和CRC。
+    """
+
+    def __init__(self, output_path, width, height=0, level=6):
+        self.output_path = output_path
+        self.width = width
+        self.height = height
+        self.rows_written = 0
+        self.bytes_written = 0
+        self._compressor = zlib.compressobj(level)
+        self._file = open(output_path, 'wb')
+        write_png_header(self._file, width, height)
+
+    def write_rows(self, rows):
+        """写入若干行像素，形状为 (行数, width, 4)"""
+        data = self._compressor.compress(filter_rows(rows))
+        if data:
+            write_chunk(self._file, b'IDAT', data)
+        self.rows_written += rows.shape[0]
+
+    def close(self):
+        """结束压缩流并回写最终高度"""
+        write_chunk(self._file, b'IDAT', self._compressor.flush())
+        write_chunk(self._file, b'IEND', b'')
+
+        if self.rows_written != self.height:
+            # IHDR数据位于签名(8字节)和chunk长度/类型(8字节)之后
+            self.height = self.rows_written
+            ihdr = struct.pack('>IIBBBBB', self.width, self.height, 8, 6, 0, 0, 0)
+            self._file.seek(16)
+            self._file.write(ihdr)
+            self._file.write(struct.pack('>I', zlib.crc32(b'IHDR' + ihdr) & 0xffffffff))
+
+        self.bytes_written = self._file.seek(0, os.SEEK_END)
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self._file.close()
+
+
+def filter_rows(rows):
+    """对若干行RGBA像素做PNG Sub滤波（每行前加滤波类型字节1）"""
+    rows = np.ascontiguousarray(rows, dtype=np.uint8)
+    height, width = rows.shape[:2]
+    flat = rows.reshape(height, width * 4)
+
+    filtered = np.empty((height, width * 4 + 1), dtype=np.uint8)
+    filtered[:, 0] = 1
+    filtered[:, 1:5] = flat[:, :4]
+    filtered[:, 5:] = flat[:, 4:] - flat[:, :-4]  # uint8减法自动按256取模
+    return filtered.tobytes()
+
+
+def write_png_header(f, width, height):
+    """写入PNG签名和IHDR（8位RGBA）"""
+    f.write(b'\x89PNG\r\n\x1a\n')
+    write_chunk(f, b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 6, 0, 0, 0))
+
+
+def write_chunk(f, chunk_type, data):
+    """写入一个PNG chunk"""
+    f.write(struct.pack('>I', len(data)))
+    f.write(chunk_type)
+    f.write(data)
+    f.write(struct.pack('>I', zlib.crc32(chunk_type + data) & 0xffffffff))
+
+
+def _adler32_combine(adler1, adler2, len2):
+    """合并两段数据的adler32（zlib的adler32_combine）"""
+    base = 65521
+    rem = len2 % base
+    sum1 = adler1 & 0xffff
+    sum2 = (rem * sum1) % base
+    sum1 += (adler2 & 0xffff) + base - 1
+    sum2 += ((adler1 >> 16) & 0xffff) + ((adler2 >> 16) & 0xffff) + base - rem
+    sum1 %= base
+    sum2 %= base
+    return (sum2 << 16) | sum1
@@ -0,0 +1,167 @@
+import math
+import numpy as np
+
+class MaxRectsPacker:
+    """MaxRects装箱算法（Best Short Side Fit），用于把裁剪后的帧紧凑地排进图集"""
+
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+        self.free_rects = [(0, 0, width, height)]
+        self.used_height = 0
+
+    def insert(self, width, height):
+        """放入一个矩形，返回左上角坐标 (x, y)，放不下时返回None"""
+        best = None
+        best_short = best_long = None
+
+        for fx, fy, fw, fh in self.free_rects:
+            if width <= fw and height <= fh:
+                short_side = min(fw - width, fh - height)
+                long_side = max(fw - width, fh - height)
+                if best is None or (short_side, long_side) < (best_short, best_long):
+                    best = (fx, fy)
+                    best_short, best_long = short_side, long_side
+
+        if best is None:
+            return None
+
+        self._split(best[0], best[1], width, height)
+        self.used_height = max(self.used_height, best[1] + height)
+        return best
+
+    def _split(self, x, y, width, height):
+        """从所有与新矩形相交的空闲区域中切出剩余部分"""
+        new_free = []
+        for fx, fy, fw, fh in self.free_rects:
+            if x >= fx + fw or x + width <= fx or y >= fy + fh or y + height <= fy:
+                new_free.append((fx, fy, fw, fh))
+                continue
+            if x > fx:
+                new_free.append((fx, fy, x - fx, fh))
+            if x + width < fx + fw:
+                new_free.append((x + width, fy, fx + fw - x - width, fh))
+            if y > fy:
+                new_free.append((fx, fy, fw, y - fy))
+            if y + height < fy + fh:
+                new_free.append((fx, y + height, fw, fy + fh - y - height))
+
+        self.free_rects = self._prune(new_free)
+
+    @staticmethod
+    def _prune(rects):
+        """移除被其他空闲区域完全包含的区域"""
+        pruned = []
+        for i, (ax, ay, aw, ah) in enumerate(rects):
+            contained = False
+            for j, (bx, by, bw, bh) in enumerate(rects):
+                if i == j:
+                    continue
+                if ax >= bx and ay >= by and ax + aw <= bx + bw and ay + ah <= by + bh:
+                    # 完全相同的区域只保留第一个
+                    if (ax, ay, aw, ah) != (bx, by, bw, bh) or j < i:
+                        contained = True
+                        break
+            if not contained:
+                pruned.append((ax, ay, aw, ah))
+        return pruned
+
+
+def pack_rects(sizes, max_width, padding=0):
+    """将一组 (宽, 高) 排入宽度不超过max_width的图集
+
+    Returns:
+        (positions, sheet_width, sheet_height)，positions与sizes一一对应
+    """
+    padded = [(w + padding, h + padding) for w, h in sizes]
+    widest = max(w for w, _ in padded)
+    total_area = sum(w * h for w, h in padded)
+
+    # 宽度取接近正方形的估计值，高度不设上限，排完后按实际占用裁剪
+    bin_width = min(max(widest, math.ceil(math.sqrt(total_area * 1.1))), max(max_width, widest))
+    bin_height = sum(h for _, h in padded)
+    packer = MaxRectsPacker(bin_width, bin_height)
+
+    # 按高度从大到小放入，装箱效果更好
+    order = sorted(range(len(sizes)), key=lambda i: (padded[i][1], padded[i][0]), reverse=True)
+    positions = [None] * len(sizes)
+    for i in order:
+        positions[i] = packer.insert(*padded[i])
+
+    sheet_width = max(x + w for (x, _), (w, _) in zip(positions, sizes))
+    sheet_height = max(y + h for (_, y), (_, h) in zip(positions, sizes))
+    return positions, sheet_width, sheet_height
+
+
+def pack_pages(sizes, max_width, max_height, padding=0):
+    """将一组 (宽, 高) 分配到若干张不超过 max_width x max_height 的图集页
+
+    Returns:
+        (positions, page_sizes)，positions[i]为 (页序号, x, y)，
+        page_sizes为每页按实际占用裁剪后的 (宽, 高)
+    """
+    padded = [(w + padding, h + padding) for w, h in sizes]
+    for w, h in sizes:
+        if w > max_width or h > max_height:
+            raise ValueError(f"帧尺寸 {w}x{h} 超出单页上限 {max_width}x{max_height}")
+
+    # 页面边缘不需要间距，因此每页可用尺寸放宽一个padding
+    page_width = max_width + padding
+    page_height = max_height + padding
+
+    packers = []
+    positions = [None] * len(sizes)
+    order = sorted(range(len(sizes)), key=lambda i: (padded[i][1], padded[i][0]), reverse=True)
+    for i in order:
+        for page, packer in enumerate(packers):
+            position = packer.insert(*padded[i])
+            if position is not None:
+                break
+        else:
+            packer = MaxRectsPacker(page_width, page_height)
+            packers.append(packer)
+            page = len(packers) - 1
+            position = packer.insert(*padded[i])
+        positions[i] = (page, position[0], position[1])
+
+    page_sizes = []
+    for page in range(len(packers)):
+        rects = [(x + w, y + h) for (p, x, y), (w, h) in zip(positions, sizes) if p == page]
+        page_sizes.append((max(r for r, _ in rects), max(b for _, b in rects)))
+    return positions, page_sizes
+
+
+def trim_alpha(frame):
+    """按alpha非零区域裁剪RGBA帧
+
+    Returns:
+        (裁剪后的帧视图, offset_x, offset_y)；全透明帧保留1x1像素
+    """
+    alpha = frame[..., 3]
+    cols = np.flatnonzero(alpha.any(axis=0))
+    if cols.size == 0:
+        return frame[:1, :1], 0, 0
+    rows = np.flatnonzero(alpha.any(axis=1))
+    x0, x1 = cols[0], cols[-1] + 1
+    y0, y1 = rows[0], rows[-1] + 1
+    return frame[y0:y1, x0:x1], int(x0), int(y0)
+
+
+def assemble_sheet(width, height, placements, background=(0, 0, 0, 0)):
+    """把若干RGBA帧按切片赋值拷入预先分配的精灵图数组
+
+    Args:
+        placements: [(帧数组, x, y)]
+        background: 空白区域的RGBA颜色
+
+    Returns:
+        (精灵图数组, 非透明像素数)，像素数用于统计填充率，无需再次解码输出文件
+    """
+    sheet = np.empty((height, width, 4), dtype=np.uint8)
+    sheet[...] = background
+    opaque = 0
+    for frame, x, y in placements:
+        h, w = frame.shape[:2]
+        sheet[y:y + h, x:x + w] = frame
+        opaque += int(np.count_nonzero(frame[..., 3]))
+    return sheet, opaque
@@ -0,0 +1,251 @@
+import asyncio
+import heapq
+import itertools
+import random
+import time
+from .utils import format_time
+
+# 默认轮询参数
+#   expected_duration: 任务的初始预计耗时（秒），之后按同一模型实际完成的耗时滑动更新
+#   min_interval / max_interval: 两次状态查询的最小/最大间隔
+#   backoff_base / backoff_max: 查询出错时指数退避的起始/最大间隔
+#   jitter: 间隔的随机抖动比例，避免大量任务在同一时刻查询
+#   timeout: 单个任务的最长等待时间
+#   max_queries: 同时进行的状态查询数
+#   report_interval: 打印进度的间隔
+DEFAULT_POLLING = {
+    'expected_duration': 60,
+    'min_interval': 2,
+    'max_interval': 20,
+    'backoff_base': 2,
+    'backoff_max': 60,
+    'jitter': 0.2,
+    'timeout': 300,
+    'max_queries': 8,
+    'report_interval': 10,
+}
+
+# 预计耗时的滑动平均权重
+_EWMA_WEIGHT = 0.3
+
+
+class TrackedTask:
+    """单个在途任务的状态"""
+
+    def __init__(self, task_id, label, group, future, created, attached):
+        self.task_id = task_id
+        self.label = label
+        self.group = group
+        self.future = future
+        # created用于预计耗时和统计；超时从开始跟踪（重新接管）的时间算起
+        self.created = created
+        self.attached = attached
+        self.status = 'queued'
+        self.polls = 0
+        self.errors = 0          # 连续查询失败次数
+        self.next_poll = created
+        self.last_report = time.time()
+
+
+class TaskTracker:
+    """统一跟踪所有在途的视频任务
+
+    所有任务共用一个轮询协程：按各任务的下次查询时间排成最小堆，只查询到期的任务。
+    查询间隔根据预计完成时间安排——离预计完成越远查询越稀疏，临近或超过预计时间时
+    按最小间隔查询；查询出错时按指数退避加随机抖动重试。
+    """
+
+    def __init__(self, client, options=None):
+        self.client = client
+        self.options = dict(DEFAULT_POLLING)
+        if options:
+            self.options.update(options)
+
+        self._tasks = {}
+        self._heap = []
+        self._seq = itertools.count()
+        self._expected = {}
+        self._wakeup = None
+        self._runner = None
+
+        self.polls = 0
+        self.errors = 0
+        self.history = []
+
+    async def wait(self, task_id, label=None, group=None, created=None):
+        """等待任务完成并返回视频URL
+
+        Args:
+            label: 日志中显示的名称
+            group: 预计耗时的统计分组（通常为视频模型）
+            created: 任务创建时间，重新接管已有任务时传入原始创建时间
+                     （只影响查询安排和耗时统计，超时仍从本次开始等待时算起）
+        """
+        now = time.time()
+        task = TrackedTask(task_id, label or task_id, group,
+                           asyncio.get_running_loop().create_future(), created or now, now)
+        self._tasks[task_id] = task
+        self._schedule(task, self._poll_interval(task, now))
+
+        if self._wakeup is None:
+            self._wakeup = asyncio.Event()
+        if self._runner is None or self._runner.done():
+            self._runner = asyncio.ensure_future(self._run())
+        self._wakeup.set()
+
+        try:
+            return await task.future
+        finally:
+            self._tasks.pop(task_id, None)
+
+    def stats(self):
+        """轮询统计"""
+        finished = [entry for entry in self.history if entry['status'] == 'succeeded']
+        durations = [entry['duration'] for entry in finished]
+        return {
+            'tracked': len(self.history) + len(self._tasks),
+            'in_flight': len(self._tasks),
+            'succeeded': len(finished),
+            'failed': len(self.history) - len(finished),
+            'polls': self.polls,
+            'errors': self.errors,
+            'polls_per_task': self.polls / max(1, len(self.history) + len(self._tasks)),
+            'mean_duration': sum(durations) / len(durations) if durations else 0.0,
+            'tasks': list(self.history),
+        }
+
+    async def _run(self):
+        """轮询主循环：查询所有到期任务，然后睡眠到下一个到期时间或有新任务加入
+
+        所有任务结束后返回，下次wait()时重新启动
+        """
+        queries = asyncio.Semaphore(self.options['max_queries'])
+
+        while self._outstanding():
+            now = time.time()
+            due = []
+            while self._heap and self._heap[0][0] <= now:
+                poll_at, _, task_id = heapq.heappop(self._heap)
+                task = self._tasks.get(task_id)
+                # 跳过已结束任务和过期的堆条目
+                if task is not None and not task.future.done() and poll_at == task.next_poll:
+                    due.append(task)
+
+            if due:
+                results = await asyncio.gather(*(self._poll(task, queries) for task in due),
+                                               return_exceptions=True)
+                # 处理结果时的意外错误只结束对应任务，不影响其他任务的轮询
+                for task, result in zip(due, results):
+                    if isinstance(result, Exception):
+                        self._finish(task, time.time() - task.created, error=result)
+                continue
+
+            delay = self._heap[0][0] - now if self._heap else None
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), delay)
+            except asyncio.TimeoutError:
+                pass
+
+        # 剩下的都是已结束任务的堆条目
+        self._heap.clear()
+
+    def _outstanding(self):
+        """是否还有未结束的任务（已结束的任务在等待方恢复执行后才移出_tasks）"""
+        return any(not task.future.done() for task in self._tasks.values())
+
+    async def _poll(self, task, queries):
+        """查询一个任务的状态并安排下一次查询"""
+        async with queries:
+            try:
+                result = await self.client.content_generation.tasks.get(task_id=task.task_id)
+                error = None
+            except Exception as e:
+                result, error = None, e
+
+        now = time.time()
+        elapsed = now - task.created
+        task.polls += 1
+        self.polls += 1
+
+        if error is not None:
+            task.errors += 1
+            self.errors += 1
+            delay = self._backoff(task.errors)
+            print(f"  查询任务状态失败，{delay:.1f}秒后重试: {error}")
+            if not self._check_timeout(task, now):
+                self._schedule(task, delay)
+            return
+
+        task.errors = 0
+        task.status = result.status
+
+        if task.status == "succeeded":
+            print(f"  {task.label} 生成完成 (用时: {format_time(int(elapsed))})")
+            self._update_expected(task.group, elapsed)
+            self._finish(task, elapsed, result=result.content.video_url)
+        elif task.status == "failed":
+            error_msg = getattr(result, 'error', '未知错误')
+            self._finish(task, elapsed, error=Exception(f"视频生成失败: {error_msg}"))
+        elif task.status == "cancelled":
+            self._finish(task, elapsed, error=Exception(f"任务被取消: {task.task_id}"))
+        elif task.status in ["queued", "running"]:
+            if now - task.last_report >= self.options['report_interval']:
+                print(f"  {task.label} 生成中... ({task.status}, {format_time(int(elapsed))})")
+                task.last_report = now
+            if not self._check_timeout(task, now):
+                self._schedule(task, self._poll_interval(task, now))
+        else:
+            self._finish(task, elapsed, error=Exception(f"未知任务状态: {task.status}"))
+
+    def _check_timeout(self, task, now):
+        """超时的任务直接结束，返回是否已超时"""
+        if now - task.attached <= self.options['timeout']:
+            return False
+        task.status = 'timeout'
+        self._finish(task, now - task.created, error=TimeoutError(f"任务超时: {task.task_id}"))
+        return True
+
+    def _finish(self, task, elapsed, result=None, error=None):
+        """记录任务结果并唤醒等待方"""
+        self.history.append({
+            'task_id': task.task_id,
+            'label': task.label,
+            'status': task.status,
+            'duration': elapsed,
+            'polls': task.polls,
+        })
+        if task.future.done():
+            return
+        if error is not None:
+            task.future.set_exception(error)
+        else:
+            task.future.set_result(result)
+
+    def _schedule(self, task, delay):
+        task.next_poll = time.time() + delay
+        heapq.heappush(self._heap, (task.next_poll, next(self._seq), task.task_id))
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def _poll_interval(self, task, now):
+        """距预计完成时间还剩一半时再查询；已超过预计时间则按最小间隔查询"""
+        expected = self._expected.get(task.group, self.options['expected_duration'])
+        remaining = expected - (now - task.created)
+        interval = remaining / 2 if remaining > 0 else self.options['min_interval']
+        interval = min(max(interval, self.options['min_interval']), self.options['max_interval'])
+        return self._jitter(interval)
+
+    def _backoff(self, attempt):
+        """第attempt次连续失败后的重试间隔"""
+        delay = min(self.options['backoff_base'] * 2 ** (attempt - 1), self.options['backoff_max'])
+        return self._jitter(delay)
+
+    def _jitter(self, delay):
+        jitter = self.options['jitter']
+        return delay * random.uniform(1 - jitter, 1 + jitter)
+
+    def _update_expected(self, group, duration):
+        """按实际耗时滑动更新该分组的预计耗时"""
+        expected = self._expected.get(group, self.options['expected_duration'])
+        self._expected[group] = (1 - _EWMA_WEIGHT) * expected + _EWMA_WEIGHT * duration
@@ -1,33 +1,24 @@
 import os
-import requests
 from typing import Optional
+from .downloader import get_downloader
 
-def download_file(url: str, output_path: str, timeout: int = 300) -> bool:
+def download_file(url: str, output_path: str, timeout: Optional[int] = None) -> bool:
     """
     下载文件到指定路径
     
+    使用共享连接池的下载器：先写入临时文件，完成并校验大小后原子重命名，
+    中断时从已下载的位置续传，大文件分段并行下载。
+    
     Args:
         url: 文件URL
         output_path: 输出路径
-        timeout: 超时时间（秒）
+        timeout: 超时时间（秒），为空时使用配置的 download.timeout
         
     Returns:
         bool: 是否下载成功
     """
     try:
-        # 确保输出目录存在
-        os.makedirs(os.path.dirname(output_path), exist_ok=True)
-        
-        # 下载文件
-        response = requests.get(url, stream=True, timeout=timeout)
-        response.raise_for_status()
-        
-        # 写入文件
-        with open(output_path, 'wb') as f:
-            for chunk in response.iter_content(chunk_size=8192):
-                if chunk:
-                    f.write(chunk)
-                    
+        get_downloader().download(url, output_path, timeout=timeout)
         return True
     except Exception as e:
         print(f"下载失败: {e}")
@@ -42,6 +33,14 @@ def format_time(seconds: int) -> str:
         secs = seconds % 60
         return f"{minutes}分{secs}秒"
 
+def format_size(size_bytes: float) -> str:
+    """格式化文件大小"""
+    for unit in ['B', 'KB', 'MB', 'GB']:
+        if size_bytes < 1024.0:
+            return f"{size_bytes:.1f} {unit}"
+        size_bytes /= 1024.0
+    return f"{size_bytes:.1f} TB"
+
 def clean_filename(filename: str) -> str:
     """清理文件名，移除非法字符"""
     invalid_chars = '<>:"/\\|?*'
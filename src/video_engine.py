@@ -0,0 +1,207 @@
+import asyncio
+import os
+import time
+from volcenginesdkarkruntime import AsyncArk
+from .downloader import get_downloader
+from .progressive_ingest import RemoteVideo
+from .task_tracker import TaskTracker
+from .utils import download_file, format_time
+
+# 默认并发上限
+#   max_tasks    : 同时在途（已创建、未完成）的视频任务总数
+#   per_model    : 按视频模型单独限制在途任务数，例如 {"doubao-seedance-1-0-pro-250528": 10}
+#   max_downloads: 同时下载的视频数
+DEFAULT_CONCURRENCY = {
+    'max_tasks': 3,
+    'per_model': {},
+    'max_downloads': 4,
+}
+
+
+class AsyncVideoEngine:
+    """基于asyncio的视频生成引擎
+
+    任务创建、状态轮询和下载都在同一个事件循环中完成，在途任务只占用协程而不是线程，
+    可以同时跟踪数百个任务。全局和按模型的并发上限由信号量控制。
+    """
+
+    def __init__(self, config, client=None, journal=None):
+        self.config = config
+        self.journal = journal
+        self._owns_client = client is None
+        self.client = client or AsyncArk(api_key=os.environ.get("ARK_API_KEY"))
+
+        # 共享下载器使用配置中的下载参数
+        get_downloader(config.get('download'))
+
+        concurrency = dict(DEFAULT_CONCURRENCY)
+        concurrency.update(config['video_settings'].get('concurrency', {}))
+        self.concurrency = concurrency
+
+        # 信号量在首次使用时创建，保证绑定到运行中的事件循环
+        self._task_slots = None
+        self._model_slots = {}
+        self._download_slots = None
+        self.tracker = None
+
+    async def close(self):
+        """关闭引擎自己创建的客户端连接"""
+        close = getattr(self.client, 'close', None)
+        if self._owns_client and close is not None:
+            await close()
+
+    def _slots(self, model):
+        """返回 (全局信号量, 模型信号量或None, 下载信号量)"""
+        if self._task_slots is None:
+            self._task_slots = asyncio.Semaphore(self.concurrency['max_tasks'])
+            self._download_slots = asyncio.Semaphore(self.concurrency['max_downloads'])
+
+        limit = self.concurrency['per_model'].get(model)
+        if limit and model not in self._model_slots:
+            self._model_slots[model] = asyncio.Semaphore(limit)
+        return self._task_slots, self._model_slots.get(model), self._download_slots
+
+    async def generate(self, image_base64, action_name, output_filename, model=None, progressive=False):
+        """生成单个视频，返回本地路径
+
+        progressive为True时不下载，返回RemoteVideo，由帧处理阶段边下载边解码
+        """
+        video_config = self.config['video_settings']
+        model = model or video_config['model']
+        task_slots, model_slots, download_slots = self._slots(model)
+
+        # 先占模型名额再占全局名额，避免被某个模型限流的任务占住全局名额
+        async with _optional(model_slots):
+            async with task_slots:
+                video_url = await self._resume_task(action_name)
+                if video_url is None:
+                    task_id = await self.create_task(image_base64, action_name, model)
+                    video_url = await self.wait_for_completion(task_id, action_name, model)
+
+        # 下载视频到本地
+        output_dir = self.config['output_paths']['videos']
+        os.makedirs(output_dir, exist_ok=True)
+        output_path = os.path.join(output_dir, output_filename)
+
+        if progressive:
+            print(f"  ✓ {action_name}: 视频已生成，开始边下载边处理")
+            return RemoteVideo(video_url, output_path)
+
+        async with download_slots:
+            ok = await asyncio.to_thread(download_file, video_url, output_path)
+        if not ok:
+            raise Exception(f"视频下载失败: {action_name}")
+
+        if self.journal is not None:
+            self.journal.record('video_downloaded', action=action_name, path=output_path)
+        print(f"  ✓ {action_name}: {output_path}")
+        return output_path
+
+    async def create_task(self, image_base64, action_name, model):
+        """创建视频生成任务，返回任务ID"""
+        action_prompt = self.config['animation_presets'][action_name]
+
+        # 从配置获取视频参数
+        video_config = self.config['video_settings']
+        duration = video_config['duration']
+        resolution = video_config.get('resolution', '720p')
+        camera_follow = video_config.get('camera_follow', False)
+        fps = video_config.get('fps', 24)
+        ratio = video_config.get('ratio', '16:9')
+
+        # 构建完整的提示词
+        cf_param = "true" if camera_follow else "false"
+        full_prompt = f"{action_prompt} --rs {resolution} --dur {duration} --cf {cf_param} --fps {fps} --rt {ratio}"
+
+        print(f"  开始生成 {action_name} 视频...")
+
+        create_result = await self.client.content_generation.tasks.create(
+            model=model,
+            content=[
+                {"text": full_prompt, "type": "text"},
+                {"image_url": {"url": image_base64}, "type": "image_url"}
+            ]
+        )
+
+        task_id = create_result.id
+        print(f"  任务已创建: {task_id}")
+        if self.journal is not None:
+            self.journal.record('task_created', action=action_name, task_id=task_id,
+                                model=model, created=time.time())
+        return task_id
+
+    async def _resume_task(self, action_name):
+        """重新接管日志中记录的任务，返回视频URL；没有可接管的任务时返回None"""
+        if self.journal is None:
+            return None
+        task = self.journal.task(action_name)
+        if task is None:
+            return None
+
+        print(f"  重新接管 {action_name} 任务: {task['task_id']}")
+        try:
+            return await self.wait_for_completion(task['task_id'], action_name,
+                                                  task['model'], task['created'])
+        except Exception as e:
+            # 任务已失败、过期或超时，重新创建
+            print(f"  ⚠️  无法接管 {action_name} 任务，重新生成: {e}")
+            return None
+
+    async def wait_for_completion(self, task_id, action_name, model=None, created=None):
+        """等待任务完成并返回视频URL（由共享的TaskTracker统一轮询）"""
+        if self.tracker is None:
+            self.tracker = TaskTracker(self.client, self.config['video_settings'].get('polling'))
+        return await self.tracker.wait(task_id, action_name, model, created)
+
+    def report_stats(self):
+        """打印状态查询统计"""
+        if self.tracker is None:
+            return
+        stats = self.tracker.stats()
+        if not stats['tracked']:
+            return
+        print(f"  📊 任务轮询: {stats['tracked']} 个任务，状态查询 {stats['polls']} 次"
+              f"（平均每任务 {stats['polls_per_task']:.1f} 次），查询失败 {stats['errors']} 次")
+        if stats['succeeded']:
+            print(f"     平均生成耗时: {format_time(int(stats['mean_duration']))}")
+
+    async def iter_videos(self, image_base64, action_names, progressive=False):
+        """并发生成多个动作的视频，按完成顺序产出 (动作, 路径)，失败时路径为None"""
+        async def run(action):
+            try:
+                return action, await self.generate(image_base64, action, f"{action}.mp4",
+                                                   progressive=progressive)
+            except Exception as e:
+                print(f"  ✗ 生成{action}视频失败: {e}")
+                return action, None
+
+        tasks = [asyncio.ensure_future(run(action)) for action in action_names]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                yield await next_done
+            self.report_stats()
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def generate_all(self, image_base64, action_names):
+        """并发生成多个动作的视频，返回 {动作: 路径}"""
+        results = {}
+        async for action, path in self.iter_videos(image_base64, action_names):
+            results[action] = path
+        return results
+
+
+class _optional:
+    """可为空的异步上下文管理器（未设置模型上限时不做限制）"""
+
+    def __init__(self, semaphore):
+        self.semaphore = semaphore
+
+    async def __aenter__(self):
+        if self.semaphore is not None:
+            await self.semaphore.acquire()
+
+    async def __aexit__(self, exc_type, exc, tb):
+        if self.semaphore is not None:
+            self.semaphore.release()